@@ -0,0 +1,120 @@
+"""
+Benchmark of LPR message decoding.
+
+Compares the previous path (json.loads, a handler dict built per message and
+nested .get() chains) with tcp.messages.decode_message and typed attribute
+access, and the full decode of live frames with the header-only passthrough
+(tcp.messages.extract_live_image). Recorded frames can be passed as a
+directory of files, one frame payload per file (without the <END> delimiter);
+otherwise synthetic frames shaped like the LPR protocol are generated.
+
+Run from the repository root, where settings find backend/.env:
+    python backend/benchmarks/bench_decoding.py [recorded_frames_dir]
+"""
+import base64
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tcp.messages import decode_message, extract_live_image, peek_header, PlatesData, Live
+
+
+ITERATIONS = 2000
+
+
+def synthetic_frames():
+    def image(size):
+        return base64.b64encode(os.urandom(size)).decode()
+
+    car = {
+        "plate": {"plate": "12ب34567", "plate_image": image(8 * 1024)},
+        "ocr_accuracy": 0.97,
+        "vision_speed": 42.0,
+        "vehicle_class": {"name": "car", "score": 0.9},
+        "vehicle_type": {"name": "sedan", "score": 0.8},
+        "vehicle_color": {"name": "white", "score": 0.7},
+    }
+    return [
+        {"messageType": "plates_data", "messageBody": {
+            "camera_id": 1, "timestamp": "2024-11-20T10:00:00", "full_image": image(200 * 1024), "cars": [car, car]}},
+        {"messageType": "live", "messageBody": {"camera_id": 1, "live_image": image(150 * 1024)}},
+        {"messageType": "heartbeat", "messageBody": {"status": "ok"}},
+        {"messageType": "resources", "messageBody": {"CPU_USAGE": 12.5, "RAM_USAGE": 40.1, "Free_Space_Percentage": 70.0}},
+        {"messageType": "camera_connection", "messageBody": {"Connection": True}},
+        {"messageType": "acknowledge", "messageBody": {"replyTo": "abc"}},
+    ]
+
+
+def load_frames(directory):
+    if directory:
+        return [path.read_bytes() for path in sorted(Path(directory).iterdir()) if path.is_file()]
+    return [json.dumps(frame).encode() for frame in synthetic_frames()]
+
+
+def legacy_path(frame):
+    parsed_message = json.loads(frame.decode("utf-8"))
+    message_type = parsed_message.get("messageType")
+    handler = {
+        "acknowledge": 1, "command_response": 2, "plates_data": 3, "live": 4,
+        "heartbeat": 5, "resources": 6, "camera_connection": 7,
+    }.get(message_type)
+    message_body = parsed_message["messageBody"]
+    if message_type == "plates_data":
+        return handler, [
+            (car.get("plate", {}).get("plate", "Unknown"), car.get("plate", {}).get("plate_image", ""),
+             car.get("ocr_accuracy", "Unknown"), car.get("vision_speed", 0.0))
+            for car in message_body.get("cars", [])
+        ]
+    if message_type == "live":
+        return handler, message_body.get("live_image")
+    return handler, message_body
+
+
+def typed_path(frame):
+    message = decode_message(frame)
+    if isinstance(message, PlatesData):
+        return type(message), [
+            (car.plate.plate, car.plate.plate_image, car.ocr_accuracy, car.vision_speed)
+            for car in message.message_body.cars
+        ]
+    if isinstance(message, Live):
+        return type(message), message.message_body.live_image
+    return type(message), message
+
+
+def passthrough_live(frame):
+    _, camera_id = peek_header(frame)
+    return camera_id, extract_live_image(frame)
+
+
+def run(func, frames):
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        for frame in frames:
+            func(frame)
+    return ITERATIONS * len(frames) / (time.perf_counter() - start)
+
+
+def main():
+    frames = load_frames(sys.argv[1] if len(sys.argv) > 1 else None)
+    total_bytes = sum(len(frame) for frame in frames)
+    print(f"{len(frames)} frames, {total_bytes / len(frames) / 1024:.1f} KiB average")
+    legacy = run(legacy_path, frames)
+    typed = run(typed_path, frames)
+    print(f"json.loads + dict access: {legacy:>10.1f} msgs/s")
+    print(f"msgspec typed structs:    {typed:>10.1f} msgs/s ({typed / legacy:.1f}x)")
+
+    live_frames = [frame for frame in frames if peek_header(frame)[0] == "live"]
+    if live_frames:
+        decoded = run(typed_path, live_frames)
+        passthrough = run(passthrough_live, live_frames)
+        print(f"live, full decode:        {decoded:>10.1f} msgs/s")
+        print(f"live, passthrough:        {passthrough:>10.1f} msgs/s ({passthrough / decoded:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Micro-benchmark for LPR frame splitting.
+
+Compares the previous str-based `<END>` splitting in SimpleTCPClient.dataReceived
+with tcp.framing.DelimitedFrameDecoder and LengthPrefixedFrameDecoder, feeding
+the same frames in TCP-sized chunks for a range of frame sizes.
+
+Run from the repository root, where settings find backend/.env:
+    python backend/benchmarks/bench_framing.py
+"""
+import base64
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tcp.framing import DelimitedFrameDecoder, LengthPrefixedFrameDecoder, encode_frame
+
+
+CHUNK_SIZE = 64 * 1024
+FRAME_SIZES = [1024, 16 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024]
+STREAM_BYTES = 32 * 1024 * 1024
+
+
+def make_payload(size: int) -> bytes:
+    image = base64.b64encode(os.urandom(size * 3 // 4)).decode()
+    body = {"messageType": "live", "messageBody": {"camera_id": 1, "live_image": image}}
+    return json.dumps(body).encode()
+
+
+def chunked(stream: bytes):
+    for i in range(0, len(stream), CHUNK_SIZE):
+        yield stream[i:i + CHUNK_SIZE]
+
+
+def legacy_split(chunks):
+    incomplete_data = ""
+    frames = 0
+    for data in chunks:
+        incomplete_data += data.decode("utf-8")
+        while "<END>" in incomplete_data:
+            full_message, incomplete_data = incomplete_data.split("<END>", 1)
+            if full_message.strip():
+                frames += 1
+    return frames
+
+
+def decoder_split(chunks):
+    decoder = DelimitedFrameDecoder(b"<END>")
+    frames = 0
+    for data in chunks:
+        decoder.feed(data)
+        while (frame := decoder.next_frame()) is not None:
+            frame.payload.decode("utf-8")
+            frames += 1
+    return frames
+
+
+def length_prefixed_split(chunks):
+    decoder = LengthPrefixedFrameDecoder()
+    frames = 0
+    for data in chunks:
+        decoder.feed(data)
+        while (frame := decoder.next_frame()) is not None:
+            frame.payload.decode("utf-8")
+            frames += 1
+    return frames
+
+
+def run(name, func, chunks):
+    start = time.perf_counter()
+    frames = func(chunks)
+    elapsed = time.perf_counter() - start
+    return frames / elapsed, elapsed
+
+
+def main():
+    print(f"{'frame size':>12} {'frames':>7} {'legacy fps':>12} {'<END> fps':>12} {'length fps':>12}")
+    for size in FRAME_SIZES:
+        payload = make_payload(size)
+        count = max(1, STREAM_BYTES // len(payload))
+        delimited_chunks = list(chunked((payload + b"<END>") * count))
+        prefixed_chunks = list(chunked(encode_frame(payload) * count))
+        legacy_fps, _ = run("legacy", legacy_split, delimited_chunks)
+        delimited_fps, _ = run("delimited", decoder_split, delimited_chunks)
+        prefixed_fps, _ = run("length-prefixed", length_prefixed_split, prefixed_chunks)
+        print(f"{size:>12} {count:>7} {legacy_fps:>12.1f} {delimited_fps:>12.1f} {prefixed_fps:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark of live frames sent to subscribers that write at different speeds.
+
+Compares broadcasting every frame to the room, which queues it on every
+socket, with the per-subscriber LiveSlot path of emit_to_requested_sids.
+A camera produces frames at FRAME_RATE for DURATION seconds; each client is
+an Engine.IO socket whose writer polls its queue like the WebSocket writer
+and then takes the client's time per frame to "write" it. The peak number
+of frames held by the server for each client, and the frames it got, show
+whether slow clients build up a backlog.
+
+Run from the repository root, where settings find backend/.env:
+    python backend/benchmarks/bench_live_slots.py
+"""
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engineio.async_socket import AsyncSocket
+from engineio.exceptions import QueueEmpty
+
+import socket_management
+from shared_resources import live_slots
+from socket_management import sio, broadcast, emit_to_requested_sids, subscription_room, LiveSlot, NAMESPACE
+
+
+FRAME_RATE = 25
+DURATION = 4.0
+FRAME_BYTES = 200 * 1024
+CAMERA_ID = 1
+# Seconds each client takes to write a frame
+CLIENTS = {"fast": 0.005, "slow": 0.2, "stalled": 2.0}
+
+
+class Client:
+    def __init__(self, name: str, write_seconds: float):
+        self.name = name
+        self.write_seconds = write_seconds
+        self.eio_sid = f"eio-{name}"
+        self.socket = AsyncSocket(sio.eio, self.eio_sid)
+        self.written = 0
+        self.peak_backlog = 0
+        self.writer = None
+
+    async def connect(self, slot: bool):
+        sio.eio.sockets[self.eio_sid] = self.socket
+        self.sid = await sio.manager.connect(self.eio_sid, NAMESPACE)
+        room = subscription_room("live", CAMERA_ID)
+        await sio.enter_room(self.sid, room)
+        if slot:
+            live_slots[(self.sid, room)] = LiveSlot(self.sid, self.eio_sid, CAMERA_ID)
+        self.writer = asyncio.ensure_future(self._write())
+
+    async def _write(self):
+        while True:
+            try:
+                packets = await self.socket.poll()
+            except QueueEmpty:
+                # Cancelled on disconnect
+                return
+            for _ in packets:
+                await asyncio.sleep(self.write_seconds)
+                self.written += 1
+
+    def sample(self):
+        self.peak_backlog = max(self.peak_backlog, self.socket.queue.qsize())
+
+    async def disconnect(self):
+        self.writer.cancel()
+        for key in [key for key in live_slots if key[0] == self.sid]:
+            live_slots.pop(key).close()
+        sio.eio.sockets.pop(self.eio_sid, None)
+        await sio.manager.disconnect(self.sid, NAMESPACE)
+
+
+async def run(emit, slot: bool):
+    clients = [Client(name, write_seconds) for name, write_seconds in CLIENTS.items()]
+    for client in clients:
+        await client.connect(slot)
+    frame = {"messageType": "live", "camera_id": CAMERA_ID, "live_image": "x" * FRAME_BYTES}
+
+    frames = int(DURATION * FRAME_RATE)
+    start = time.monotonic()
+    for index in range(frames):
+        await emit(frame)
+        for client in clients:
+            client.sample()
+        await asyncio.sleep(max(0.0, start + (index + 1) / FRAME_RATE - time.monotonic()))
+
+    results = []
+    for client in clients:
+        slot_state = live_slots.get((client.sid, subscription_room("live", CAMERA_ID)))
+        dropped = slot_state.dropped if slot_state else 0
+        results.append((client.name, client.written / DURATION, client.peak_backlog, dropped))
+        await client.disconnect()
+    return frames, results
+
+
+async def room_broadcast(frame):
+    await broadcast("live", frame, subscription_room("live", CAMERA_ID))
+
+
+async def slot_emit(frame):
+    await emit_to_requested_sids("live", frame, CAMERA_ID)
+
+
+async def main():
+    socket_management.logger.disabled = True
+    for name, emit, slot in (("broadcast", room_broadcast, False), ("live slots", slot_emit, True)):
+        frames, results = await run(emit, slot)
+        print(f"{name}: {frames} frames of {FRAME_BYTES // 1024} KiB at {FRAME_RATE} fps")
+        print(f"{'client':>9} {'written fps':>12} {'peak queued':>12} {'dropped':>8}")
+        for client, fps, backlog, dropped in results:
+            print(f"{client:>9} {fps:>12.1f} {backlog:>12} {dropped:>8}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+"""
+Benchmark of broadcasting a large plates_data event to the clients of a room.
+
+Compares one sio.emit per subscriber, which serializes the event for each
+of them, and sio.emit to the room, which serializes it once but queues it
+with one task per recipient, with socket_management.broadcast, which
+encodes it once and queues the same packets on every socket directly.
+Clients are real Engine.IO sockets without a transport: after each event
+their queues are drained and the packets encoded, as the WebSocket writer
+would, so the time covers everything up to handing the frame to the
+server.
+
+Run from the repository root, where settings find backend/.env:
+    python backend/benchmarks/bench_socketio_broadcast.py [image KiB]
+"""
+import os
+import sys
+import time
+import base64
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engineio.async_socket import AsyncSocket
+
+import socket_management
+from socket_management import sio, broadcast, NAMESPACE
+
+
+SUBSCRIBER_COUNTS = [1, 10, 100, 1000]
+EVENTS = 10
+ROOM = "plates_data:1"
+
+
+def make_payload(image_kib: int):
+    return {
+        "messageType": "plates_data",
+        "camera_id": 1,
+        "full_image": base64.b64encode(os.urandom(image_kib * 1024)).decode(),
+        "cars": [{"plate_number": "12ب34567", "ocr_accuracy": 0.9, "plate_image": ""}],
+    }
+
+
+async def connect_clients(count: int):
+    for eio_sid in list(sio.eio.sockets):
+        sio.eio.sockets.pop(eio_sid)
+        sid = sio.manager.sid_from_eio_sid(eio_sid, NAMESPACE)
+        if sid:
+            await sio.manager.disconnect(sid, NAMESPACE)
+    for index in range(count):
+        eio_sid = f"eio-{count}-{index}"
+        sio.eio.sockets[eio_sid] = AsyncSocket(sio.eio, eio_sid)
+        sid = await sio.manager.connect(eio_sid, NAMESPACE)
+        await sio.enter_room(sid, ROOM)
+
+
+def drain_sockets() -> int:
+    """Encodes what each socket's writer would send, returning the bytes sent."""
+    sent = 0
+    for socket in sio.eio.sockets.values():
+        while not socket.queue.empty():
+            sent += len(socket.queue.get_nowait().encode())
+    return sent
+
+
+async def emit_per_sid(data):
+    await asyncio.gather(*(
+        sio.emit("plates_data", data, to=sid) for sid, _ in sio.manager.get_participants(NAMESPACE, ROOM)
+    ))
+
+
+async def room_emit(data):
+    await sio.emit("plates_data", data, room=ROOM)
+
+
+async def room_broadcast(data):
+    await broadcast("plates_data", data, ROOM)
+
+
+async def run(emit, data):
+    sent = 0
+    start = time.process_time()
+    for _ in range(EVENTS):
+        await emit(data)
+        sent += drain_sockets()
+    elapsed = time.process_time() - start
+    return elapsed / EVENTS * 1e3, sent / EVENTS
+
+
+async def main():
+    image_kib = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    socket_management.logger.disabled = True
+    data = make_payload(image_kib)
+    print(f"{image_kib} KiB full_image, {EVENTS} events per run, CPU time per event")
+    print(f"{'clients':>8} {'per sid ms':>11} {'room ms':>9} {'broadcast ms':>13} {'MiB sent':>9}")
+    for count in SUBSCRIBER_COUNTS:
+        await connect_clients(count)
+        per_sid_ms, per_sid_sent = await run(emit_per_sid, data)
+        room_ms, room_sent = await run(room_emit, data)
+        broadcast_ms, broadcast_sent = await run(room_broadcast, data)
+        assert per_sid_sent == room_sent == broadcast_sent
+        print(f"{count:>8} {per_sid_ms:>11.2f} {room_ms:>9.2f} {broadcast_ms:>13.2f} {broadcast_sent / 2**20:>9.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
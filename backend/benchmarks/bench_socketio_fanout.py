@@ -0,0 +1,90 @@
+"""
+Benchmark of fanning out per-camera events to Socket.IO subscribers.
+
+Compares the previous emit_to_requested_sids, which scanned every SID
+subscribed to the event and created one sio.emit task per match, with the
+room-based one, for 1,000 dashboard clients spread over a number of
+cameras. Clients are Engine.IO sockets without a transport, registered
+with the Socket.IO manager directly; the packets queued on them are
+counted and dropped, so only the fan-out itself is timed.
+
+Run from the repository root, where settings find backend/.env:
+    python backend/benchmarks/bench_socketio_fanout.py [clients]
+"""
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engineio.async_socket import AsyncSocket
+
+import socket_management
+from socket_management import sio, request_map, subscription_room, emit_to_requested_sids, NAMESPACE
+
+
+CAMERA_COUNTS = [1, 10, 100]
+EMITS = 200
+PAYLOAD = {"messageType": "plates_data", "camera_id": 0, "cars": [{"plate_number": "12ب34567", "ocr_accuracy": 0.9}]}
+
+
+async def legacy_emit(event_name, data, camera_id=None):
+    tasks = []
+    for sid, camera_ids in request_map[event_name].items():
+        if camera_id is None or camera_id in camera_ids:
+            tasks.append(asyncio.create_task(sio.emit(event_name, data, to=sid)))
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def subscribe_clients(clients: int, cameras: int):
+    for sid in list(request_map["plates_data"]):
+        sio.eio.sockets.pop(sio.manager.eio_sid_from_sid(sid, NAMESPACE), None)
+        await sio.manager.disconnect(sid, NAMESPACE)
+    request_map["plates_data"].clear()
+    for index in range(clients):
+        eio_sid = f"eio-{cameras}-{index}"
+        sio.eio.sockets[eio_sid] = AsyncSocket(sio.eio, eio_sid)
+        sid = await sio.manager.connect(eio_sid, NAMESPACE)
+        camera_id = index % cameras
+        request_map["plates_data"][sid] = {camera_id}
+        await sio.enter_room(sid, subscription_room("plates_data", camera_id))
+        await sio.enter_room(sid, subscription_room("plates_data"))
+
+
+def drop_packets() -> int:
+    sent = 0
+    for socket in sio.eio.sockets.values():
+        sent += socket.queue.qsize()
+        while not socket.queue.empty():
+            socket.queue.get_nowait()
+    return sent
+
+
+async def run(emit, cameras: int):
+    elapsed = 0.0
+    sent = 0
+    for index in range(EMITS):
+        start = time.perf_counter()
+        await emit("plates_data", PAYLOAD, index % cameras)
+        elapsed += time.perf_counter() - start
+        sent += drop_packets()
+    return elapsed / EMITS * 1e6, sent / EMITS
+
+
+async def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    socket_management.logger.disabled = True
+    print(f"{clients} clients, {EMITS} emits per run")
+    print(f"{'cameras':>8} {'recipients':>11} {'scan us/emit':>13} {'rooms us/emit':>14}")
+    for cameras in CAMERA_COUNTS:
+        await subscribe_clients(clients, cameras)
+        legacy_us, legacy_recipients = await run(legacy_emit, cameras)
+        rooms_us, rooms_recipients = await run(emit_to_requested_sids, cameras)
+        assert legacy_recipients == rooms_recipients
+        print(f"{cameras:>8} {rooms_recipients:>11.0f} {legacy_us:>13.1f} {rooms_us:>14.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+"""
+Benchmark of storing detected plates.
+
+Compares the previous path (TrafficOperation.create_traffic, one session and
+transaction per plate) with tcp.traffic_writer.TrafficWriter using multi-row
+INSERT ... RETURNING and COPY, under a few flush policies. Needs the database
+configured in .env with at least one camera; the benchmark rows are deleted
+afterwards.
+
+Run from the repository root, where settings find backend/.env:
+    python backend/benchmarks/bench_traffic_writer.py [plates]
+"""
+import os
+import sys
+import time
+import asyncio
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete
+from sqlalchemy.future import select
+
+from database.engine import async_session, engine
+from crud.traffic import TrafficOperation
+from models.camera import DBCamera
+from models.traffic import DBTraffic
+from schema.traffic import TrafficCreate
+from tcp.traffic_writer import TrafficWriter, METHOD_INSERT, METHOD_COPY
+from utils.topology import topology
+
+
+PLATE_PREFIX = "BENCH"
+POLICIES = [
+    # (method, flush interval ms, max rows)
+    (METHOD_INSERT, 50, 100),
+    (METHOD_INSERT, 50, 500),
+    (METHOD_INSERT, 200, 1000),
+    (METHOD_COPY, 50, 500),
+]
+
+
+def make_plates(count, camera_id):
+    return [
+        TrafficCreate(
+            plate_number=f"{PLATE_PREFIX}{i:06d}",
+            ocr_accuracy=0.95,
+            vision_speed=40.0,
+            timestamp=datetime.now(),
+            camera_id=camera_id,
+            plate_image_path=None,
+        )
+        for i in range(count)
+    ]
+
+
+async def per_plate_path(plates):
+    start = time.perf_counter()
+    for plate in plates:
+        async with async_session() as session:
+            await TrafficOperation(session).create_traffic(plate)
+    return len(plates) / (time.perf_counter() - start)
+
+
+async def writer_path(plates, method, flush_interval_ms, max_rows):
+    writer = TrafficWriter(flush_interval_ms=flush_interval_ms, max_rows=max_rows, method=method)
+    start = time.perf_counter()
+    futures = [await writer.submit(plate) for plate in plates]
+    await asyncio.gather(*futures)
+    rate = len(plates) / (time.perf_counter() - start)
+    await writer.stop()
+    return rate
+
+
+async def cleanup():
+    async with async_session() as session:
+        await session.execute(delete(DBTraffic).where(DBTraffic.plate_number.like(f"{PLATE_PREFIX}%")))
+        await session.commit()
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    async with async_session() as session:
+        camera_id = (await session.execute(select(DBCamera.id).limit(1))).scalar_one_or_none()
+    if camera_id is None:
+        sys.exit("No camera found, start the backend once to create the default ones.")
+
+    await topology.load()
+    plates = make_plates(count, camera_id)
+    try:
+        baseline = await per_plate_path(plates)
+        await cleanup()
+        print(f"{count} plates")
+        print(f"create_traffic per plate:          {baseline:>10.1f} rows/s")
+        for method, flush_interval_ms, max_rows in POLICIES:
+            rate = await writer_path(plates, method, flush_interval_ms, max_rows)
+            await cleanup()
+            label = f"writer {method}, {flush_interval_ms} ms / {max_rows} rows:"
+            print(f"{label:<35}{rate:>10.1f} rows/s ({rate / baseline:.1f}x)")
+    finally:
+        await cleanup()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,12 +1,17 @@
 import math
 from fastapi import HTTPException, status
-from sqlalchemy import func
 from sqlalchemy.future import select
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from utils.topology import topology
+from utils.counting import count_rows
+
 
 class CrudOperation:
+    # Set by operations on tables the topology registry mirrors (cameras, gates, LPRs)
+    invalidates_topology = False
+
     def __init__(self, db_session: AsyncSession, db_table) -> None:
         self.db_session = db_session
         self.db_table = db_table
@@ -28,8 +33,7 @@ class CrudOperation:
         return object
 
     async def get_all_objects(self, page: int=1, page_size: int=10):
-        total_query = await self.db_session.execute(select(func.count(self.db_table.id)))
-        total_records = total_query.scalar_one()
+        total_records, total_is_exact = await count_rows(self.db_session, select(self.db_table))
 
         # Calculate total number of pages
         total_pages = math.ceil(total_records / page_size) if page_size else 1
@@ -46,6 +50,7 @@ class CrudOperation:
         return {
             "items": objects,
             "total_records": total_records,
+            "total_is_exact": total_is_exact,
             "total_pages": total_pages,
             "current_page": page,
             "page_size": page_size,
@@ -63,6 +68,8 @@ class CrudOperation:
             self.db_session.add(db_object)
             await self.db_session.commit()
             await self.db_session.refresh(db_object)
+            if self.invalidates_topology:
+                await topology.invalidate()
             # Return the appropriate message
             status_message = "activated" if db_object.is_active else "deactivated"
             return {"message": status_message}
@@ -80,6 +87,8 @@ class CrudOperation:
         try:
             await self.db_session.delete(db_object)
             await self.db_session.commit()
+            if self.invalidates_topology:
+                await topology.invalidate()
             return db_object
             # return {"message": f"object {db_object.name} deleted successfully"}
         except SQLAlchemyError as error:
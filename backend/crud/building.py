@@ -1,6 +1,5 @@
 import math
 from fastapi import HTTPException, status
-from sqlalchemy import func
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -9,6 +8,7 @@ from crud.base import CrudOperation
 from models.building import DBBuilding
 from models.gate import DBGate
 from schema.building import BuildingUpdate, BuildingCreate
+from utils.counting import count_rows
 
 
 
@@ -59,8 +59,7 @@ class BuildingOperation(CrudOperation):
             await self.db_session.close()
 
     async def get_building_all_gates(self, building_id: int, page: int=1, page_size: int=10):
-        total_query = await self.db_session.execute(select(func.count(DBGate.id)).where(DBGate.building_id == building_id))
-        total_records = total_query.scalar_one()
+        total_records, total_is_exact = await count_rows(self.db_session, select(DBGate).where(DBGate.building_id == building_id))
 
         # Calculate total number of pages
         total_pages = math.ceil(total_records / page_size) if page_size else 1
@@ -77,6 +76,7 @@ class BuildingOperation(CrudOperation):
         return {
             "items": objects,
             "total_records": total_records,
+            "total_is_exact": total_is_exact,
             "total_pages": total_pages,
             "current_page": page,
             "page_size": page_size,
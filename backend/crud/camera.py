@@ -1,22 +1,25 @@
 import math
 from fastapi import HTTPException, status
-from sqlalchemy import func
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from tcp.tcp_manager import add_connection, update_connection
 from crud.base import CrudOperation
+from utils.topology import topology
 from crud.gate import GateOperation
 from crud.lpr import LprOperation
 from models.camera_setting import DBCameraSetting, DBCameraSettingInstance
 from models.camera import DBCamera
 from schema.camera import CameraUpdate, CameraCreate
 from schema.camera_setting import CameraSettingInstanceUpdate, CameraSettingInstanceCreate
+from utils.counting import count_rows
 
 
 
 class CameraOperation(CrudOperation):
+    invalidates_topology = True
+
     def __init__(self, db_session: AsyncSession) -> None:
         super().__init__(db_session, DBCamera)
 
@@ -55,6 +58,7 @@ class CameraOperation(CrudOperation):
 
             await self.db_session.commit()
             await self.db_session.refresh(new_camera)
+            await topology.invalidate()
 
             return new_camera
         except SQLAlchemyError as error:
@@ -84,6 +88,7 @@ class CameraOperation(CrudOperation):
             self.db_session.add(db_camera)
             await self.db_session.commit()
             await self.db_session.refresh(db_camera)
+            await topology.invalidate()
 
             return db_camera
         except SQLAlchemyError as error:
@@ -96,8 +101,7 @@ class CameraOperation(CrudOperation):
             await self.db_session.close()
 
     async def get_camera_all_settings(self, camera_id: int, page: int=1, page_size: int=10):
-        total_query = await self.db_session.execute(select(func.count(DBCameraSettingInstance.id)).where(DBCameraSettingInstance.camera_id == camera_id))
-        total_records = total_query.scalar_one()
+        total_records, total_is_exact = await count_rows(self.db_session, select(DBCameraSettingInstance).where(DBCameraSettingInstance.camera_id == camera_id))
 
         # Calculate total number of pages
         total_pages = math.ceil(total_records / page_size) if page_size else 1
@@ -114,6 +118,7 @@ class CameraOperation(CrudOperation):
         return {
             "items": objects,
             "total_records": total_records,
+            "total_is_exact": total_is_exact,
             "total_pages": total_pages,
             "current_page": page,
             "page_size": page_size,
@@ -1,20 +1,23 @@
 import math
 from fastapi import HTTPException, status
-from sqlalchemy import func
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from crud.base import CrudOperation
+from utils.topology import topology
 from crud.building import BuildingOperation
 from models.gate import DBGate
 from models.camera import DBCamera
 from schema.gate import GateUpdate, GateCreate
+from utils.counting import count_rows
 
 
 
 
 class GateOperation(CrudOperation):
+    invalidates_topology = True
+
     def __init__(self, db_session: AsyncSession) -> None:
         super().__init__(db_session, DBGate)
 
@@ -33,6 +36,7 @@ class GateOperation(CrudOperation):
             self.db_session.add(new_gate)
             await self.db_session.commit()
             await self.db_session.refresh(new_gate)
+            await topology.invalidate()
             return new_gate
         except SQLAlchemyError as error:
             await self.db_session.rollback()
@@ -56,6 +60,7 @@ class GateOperation(CrudOperation):
             self.db_session.add(db_gate)
             await self.db_session.commit()
             await self.db_session.refresh(db_gate)
+            await topology.invalidate()
             return db_gate
         except SQLAlchemyError as error:
             await self.db_session.rollback()
@@ -69,8 +74,7 @@ class GateOperation(CrudOperation):
 
 
     async def get_gate_all_cameras(self, gate_id: int, page: int=1, page_size: int=10):
-        total_query = await self.db_session.execute(select(func.count(DBCamera.id)).where(DBCamera.gate_id == gate_id))
-        total_records = total_query.scalar_one()
+        total_records, total_is_exact = await count_rows(self.db_session, select(DBCamera).where(DBCamera.gate_id == gate_id))
 
         # Calculate total number of pages
         total_pages = math.ceil(total_records / page_size) if page_size else 1
@@ -87,6 +91,7 @@ class GateOperation(CrudOperation):
         return {
             "items": objects,
             "total_records": total_records,
+            "total_is_exact": total_is_exact,
             "total_pages": total_pages,
             "current_page": page,
             "page_size": page_size,
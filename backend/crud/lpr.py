@@ -1,21 +1,24 @@
 import math
 from fastapi import HTTPException, status
-from sqlalchemy import func
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from settings import settings
 from crud.base import CrudOperation
+from utils.topology import topology
 from models.lpr_setting import DBLprSetting, DBLprSettingInstance
 from models.camera import DBCamera
 from models.lpr import DBLpr
 from schema.lpr import LprUpdate, LprCreate
 from schema.lpr_setting import LprSettingInstanceCreate, LprSettingInstanceUpdate
 from tcp.tcp_manager import add_connection, update_connection, remove_connection
+from utils.counting import count_rows
 
 
 class LprOperation(CrudOperation):
+    invalidates_topology = True
+
     def __init__(self, db_session: AsyncSession) -> None:
         super().__init__(db_session, DBLpr)
 
@@ -54,6 +57,7 @@ class LprOperation(CrudOperation):
 
             await self.db_session.commit()
             await self.db_session.refresh(new_lpr)
+            await topology.invalidate()
 
 
             return new_lpr
@@ -72,6 +76,7 @@ class LprOperation(CrudOperation):
             self.db_session.add(db_lpr)
             await self.db_session.commit()
             await self.db_session.refresh(db_lpr)
+            await topology.invalidate()
 
             return db_lpr
         except SQLAlchemyError as error:
@@ -88,6 +93,7 @@ class LprOperation(CrudOperation):
         try:
             await self.db_session.delete(db_lpr)
             await self.db_session.commit()
+            await topology.invalidate()
 
             # Remove connection from Twisted
             # remove_connection(lpr_id)
@@ -102,8 +108,7 @@ class LprOperation(CrudOperation):
 
 
     async def get_lpr_all_cameras(self, lpr_id: int, page: int=1, page_size: int=10):
-        total_query = await self.db_session.execute(select(func.count(DBCamera.id)).where(DBCamera.lpr_id == lpr_id))
-        total_records = total_query.scalar_one()
+        total_records, total_is_exact = await count_rows(self.db_session, select(DBCamera).where(DBCamera.lpr_id == lpr_id))
 
         # Calculate total number of pages
         total_pages = math.ceil(total_records / page_size) if page_size else 1
@@ -120,14 +125,14 @@ class LprOperation(CrudOperation):
         return {
             "items": objects,
             "total_records": total_records,
+            "total_is_exact": total_is_exact,
             "total_pages": total_pages,
             "current_page": page,
             "page_size": page_size,
         }
 
     async def get_lpr_all_settings(self, lpr_id: int, page: int=1, page_size: int=10):
-        total_query = await self.db_session.execute(select(func.count(DBLprSettingInstance.id)).where(DBLprSettingInstance.lpr_id == lpr_id))
-        total_records = total_query.scalar_one()
+        total_records, total_is_exact = await count_rows(self.db_session, select(DBLprSettingInstance).where(DBLprSettingInstance.lpr_id == lpr_id))
 
         # Calculate total number of pages
         total_pages = math.ceil(total_records / page_size) if page_size else 1
@@ -144,6 +149,7 @@ class LprOperation(CrudOperation):
         return {
             "items": objects,
             "total_records": total_records,
+            "total_is_exact": total_is_exact,
             "total_pages": total_pages,
             "current_page": page,
             "page_size": page_size,
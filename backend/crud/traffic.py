@@ -1,23 +1,29 @@
+import logging
 import base64
 import math
-import os
-from pathlib import Path
 from fastapi import HTTPException, status
-from sqlalchemy import func
+from sqlalchemy import func, text, tuple_
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 
 from crud.base import CrudOperation
-from crud.gate import GateOperation
-from crud.camera import CameraOperation
 from models.traffic import DBTraffic
 from schema.traffic import TrafficCreate
+from utils.topology import topology
+from utils.image_store import image_store
+from utils.plates import normalize_plate, escape_like, fuzzy_similarity_threshold
+from utils.counting import count_rows
+from utils.cursor import encode_cursor, decode_cursor, DIRECTION_NEXT, DIRECTION_PREV
 
+logger = logging.getLogger(__name__)
 
-BASE_UPLOAD_DIR = Path("uploads/plate_images")
-BASE_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+SEARCH_SUBSTRING = "substring"
+SEARCH_PREFIX = "prefix"
+SEARCH_FUZZY = "fuzzy"
+SEARCH_MODES = (SEARCH_SUBSTRING, SEARCH_PREFIX, SEARCH_FUZZY)
 
 
 class TrafficOperation(CrudOperation):
@@ -31,23 +37,28 @@ class TrafficOperation(CrudOperation):
         object = result.unique().scalar_one_or_none()
         return object
 
-    async def create_traffic(self, traffic: TrafficCreate):
+    async def create_traffic(self, traffic: TrafficCreate, plate_image: bytes = None):
+        """
+        Stores a traffic record. The plate image is taken from `plate_image` when
+        the raw JPEG bytes are available, otherwise from the base64 string in
+        `traffic.plate_image_path`.
+        """
         # db_vehicle = await VehicleOperation(self.db_session).get_one_vehcile_plate(traffic.plate_number)
         # db_user = await UserOperation(self.db_session).get_one_object_id(db_vehicle.owner_id) if db_vehicle and db_vehicle.owner_id else None
-        db_camera = await CameraOperation(self.db_session).get_one_object_id(traffic.camera_id)
-        db_gate = await GateOperation(self.db_session).get_one_object_id(db_camera.gate_id)
+        gate_id = topology.gate_id(traffic.camera_id)
+        if gate_id is None:
+            await topology.load()
+            gate_id = topology.gate_id(traffic.camera_id)
+        if gate_id is None:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, f"{traffic.camera_id} not found in cameras!")
 
         try:
             plate_image_path = None
-            if traffic.plate_image_path:
+            if plate_image or traffic.plate_image_path:
                 try:
-                    # Decode the base64 image and save it to the file system
-                    image_bytes = base64.b64decode(traffic.plate_image_path)
-                    image_name = f"{traffic.plate_number}_{traffic.timestamp.isoformat().replace(':', '-')}.jpg"
-                    image_path = BASE_UPLOAD_DIR / image_name
-                    with open(image_path, "wb") as img_file:
-                        img_file.write(image_bytes)
-                    plate_image_path = str(image_path)
+                    # Decode the base64 image (if needed) and save it to the image store
+                    image_bytes = plate_image or base64.b64decode(traffic.plate_image_path)
+                    plate_image_path = await image_store.put(image_bytes)
                 except Exception as e:
                     raise HTTPException(
                         status_code=status.HTTP_400_BAD_REQUEST,
@@ -56,12 +67,13 @@ class TrafficOperation(CrudOperation):
             naive_timestamp = traffic.timestamp.replace(tzinfo=None)
             new_traffic = self.db_table(
                 plate_number = traffic.plate_number,
+                plate_normalized = normalize_plate(traffic.plate_number),
                 ocr_accuracy = traffic.ocr_accuracy,
                 vision_speed = traffic.vision_speed,
                 plate_image_path=plate_image_path,
                 timestamp = naive_timestamp,
-                camera_id = db_camera.id,
-                gate_id = db_gate.id,
+                camera_id = traffic.camera_id,
+                gate_id = gate_id,
             )
             self.db_session.add(new_traffic)
             await self.db_session.commit()
@@ -92,34 +104,65 @@ class TrafficOperation(CrudOperation):
         plate_number: str = None,
         start_date: datetime = None,
         end_date: datetime = None,
+        keyset: bool = False,
+        cursor: str = None,
     ):
         """
         Retrieve all traffic data with optional filters for gate_id, camera_id, plate_number, and date range, with pagination.
+
+        The table is partitioned on timestamp: a date range limits the scan to
+        the partitions it covers, and ordering by (timestamp, id) lets the
+        partitions be read in order through their indexes instead of sorted.
+
+        With `keyset` (or a `cursor`), pages are read from a cursor over
+        (timestamp, id) instead of counted and offset; see _get_traffics_by_cursor.
         """
-        query = select(self.db_table).order_by(self.db_table.id)
+        query = self.filter_traffics(gate_id, camera_id, plate_number, start_date, end_date)
+
+        if keyset or cursor is not None:
+            return await self._get_traffics_by_cursor(query, page_size, cursor)
+        query = query.order_by(self.db_table.timestamp, self.db_table.id)
+        return await self._get_page(query, page, page_size)
 
-        # Apply filters
+    def filter_traffics(
+        self,
+        gate_id: int = None,
+        camera_id: int = None,
+        plate_number: str = None,
+        start_date: datetime = None,
+        end_date: datetime = None,
+    ):
+        """Returns the (unordered) select of the traffic matching the filters of the list and export endpoints."""
+        query = select(self.db_table)
         if gate_id is not None:
             query = query.where(self.db_table.gate_id == gate_id)
         if camera_id is not None:
             query = query.where(self.db_table.camera_id == camera_id)
         if plate_number is not None:
+            # Plain substring match; OCR-tolerant matching is search_plates' job
             query = query.where(self.db_table.plate_number.like(f"%{plate_number}%"))
+        # timestamp is stored without a time zone; an aware bound would not match it
         if start_date is not None:
-            query = query.where(self.db_table.timestamp >= start_date)
+            query = query.where(self.db_table.timestamp >= start_date.replace(tzinfo=None))
         if end_date is not None:
-            query = query.where(self.db_table.timestamp <= end_date)
+            query = query.where(self.db_table.timestamp <= end_date.replace(tzinfo=None))
+        return query
+
+    async def any_traffic(self, query) -> bool:
+        result = await self.db_session.execute(query.with_only_columns(self.db_table.id).limit(1))
+        return result.first() is not None
 
+    async def _get_page(self, query, page, page_size):
         try:
-            # Get total records count with filters
-            total_query = await self.db_session.execute(select(func.count()).select_from(query.subquery()))
-            total_records = total_query.scalar_one()
+            # Exact, estimated or cached, depending on COUNT_STRATEGY and the table size
+            total_records, total_is_exact = await count_rows(self.db_session, query)
 
             # Handle edge case: No records
             if total_records == 0:
                 return {
                     "items": [],
                     "total_records": 0,
+                    "total_is_exact": total_is_exact,
                     "total_pages": 0,
                     "current_page": page,
                     "page_size": page_size,
@@ -137,10 +180,115 @@ class TrafficOperation(CrudOperation):
             return {
                 "items": objects,
                 "total_records": total_records,
+                "total_is_exact": total_is_exact,
                 "total_pages": total_pages,
                 "current_page": page,
                 "page_size": page_size,
             }
         except Exception as e:
-            print(f"[ERROR] Failed to fetch traffic data: {e}")
+            logger.error(f"Failed to fetch traffic data: {e}")
+            raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, "Failed to fetch traffic data.")
+
+    async def _get_traffics_by_cursor(self, query, page_size: int, cursor: str = None):
+        """
+        Keyset pagination: the page starts right after (or ends right before)
+        the (timestamp, id) of the cursor, so the index range scan starts
+        there whatever the depth, and no count is needed. Rows inserted
+        meanwhile don't shift the pages; new ones show up on the last page.
+
+        One extra row is read to tell whether there is a page further on.
+        """
+        key = tuple_(self.db_table.timestamp, self.db_table.id)
+        direction = DIRECTION_NEXT
+        if cursor is not None:
+            timestamp, id, direction = decode_cursor(cursor)
+            query = query.where(key > tuple_(timestamp, id) if direction == DIRECTION_NEXT else key < tuple_(timestamp, id))
+
+        if direction == DIRECTION_NEXT:
+            query = query.order_by(self.db_table.timestamp, self.db_table.id)
+        else:
+            query = query.order_by(self.db_table.timestamp.desc(), self.db_table.id.desc())
+
+        try:
+            result = await self.db_session.execute(query.limit(page_size + 1))
+            objects = list(result.scalars().all())
+        except Exception as e:
+            logger.error(f"Failed to fetch traffic data: {e}")
             raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, "Failed to fetch traffic data.")
+
+        has_more = len(objects) > page_size
+        objects = objects[:page_size]
+        if direction == DIRECTION_PREV:
+            objects.reverse()
+        # Moving forward from a cursor there is something before it, and backward something after it
+        has_next = has_more if direction == DIRECTION_NEXT else cursor is not None
+        has_prev = has_more if direction == DIRECTION_PREV else cursor is not None
+
+        return {
+            "items": objects,
+            "page_size": page_size,
+            "next_cursor": encode_cursor(objects[-1].timestamp, objects[-1].id, DIRECTION_NEXT) if objects and has_next else None,
+            "prev_cursor": encode_cursor(objects[0].timestamp, objects[0].id, DIRECTION_PREV) if objects and has_prev else None,
+        }
+
+
+    async def search_plates(
+        self,
+        query: str,
+        mode: str = SEARCH_FUZZY,
+        max_distance: int = 2,
+        limit: int = 20,
+        camera_id: int = None,
+        start_date: datetime = None,
+        end_date: datetime = None,
+    ):
+        """
+        Searches plates tolerating OCR errors. Both the stored plates and the
+        query are compared in search form (see utils.plates.normalize_plate).
+
+        - substring / prefix: LIKE on the search form, best matches first.
+        - fuzzy: plates within `max_distance` edits of the query. Trigram
+          similarity (%) narrows the candidates through the GiST index, with
+          a threshold low enough to keep every plate that close (see
+          utils.plates.fuzzy_similarity_threshold), orders them nearest
+          first (<->), then levenshtein() keeps the close ones.
+
+        Returns the normalized query and (traffic, similarity) pairs.
+        """
+        normalized = normalize_plate(query)
+        column = self.db_table.plate_normalized
+        similarity = func.similarity(column, normalized).label("similarity")
+        statement = select(self.db_table, similarity).limit(limit)
+
+        if mode == SEARCH_FUZZY:
+            statement = statement.where(
+                column.op("%")(normalized),
+                func.levenshtein(column, normalized) <= max_distance,
+            ).order_by(column.op("<->")(normalized), self.db_table.timestamp.desc())
+        else:
+            pattern = escape_like(normalized) + "%"
+            if mode == SEARCH_SUBSTRING:
+                pattern = "%" + pattern
+            statement = statement.where(column.like(pattern, escape="\\")).order_by(
+                similarity.desc(), self.db_table.timestamp.desc()
+            )
+
+        if camera_id is not None:
+            statement = statement.where(self.db_table.camera_id == camera_id)
+        if start_date is not None:
+            statement = statement.where(self.db_table.timestamp >= start_date.replace(tzinfo=None))
+        if end_date is not None:
+            statement = statement.where(self.db_table.timestamp <= end_date.replace(tzinfo=None))
+
+        try:
+            if mode == SEARCH_FUZZY:
+                # pg_trgm's default of 0.3 drops plates two OCR errors away from an 8-character query
+                await self.db_session.execute(
+                    text("SELECT set_config('pg_trgm.similarity_threshold', :threshold, true)"),
+                    {"threshold": str(fuzzy_similarity_threshold(normalized, max_distance))},
+                )
+            result = await self.db_session.execute(statement)
+            return normalized, result.all()
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to search plates: {e}")
+            raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, "Failed to search plates.")
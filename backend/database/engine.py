@@ -14,8 +14,8 @@ DATABASE_URL = (
 )
 engine: AsyncEngine = create_async_engine(
     DATABASE_URL,
-    echo=True,
-    echo_pool=True,
+    echo=settings.DB_ECHO,
+    echo_pool=settings.DB_ECHO,
     future=True,
     pool_size=5,  # Lower to reduce pressure on the database
     max_overflow=10,  # Allow some flexibility for overflow
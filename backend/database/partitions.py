@@ -0,0 +1,177 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import text
+
+from settings import settings
+from database.engine import engine
+from models.traffic import DBTraffic
+
+logger = logging.getLogger(__name__)
+
+
+TABLE = DBTraffic.__tablename__
+DEFAULT_PARTITION = f"{TABLE}_default"
+INTERVAL_DAY = "day"
+INTERVAL_MONTH = "month"
+NAME_FORMATS = {INTERVAL_DAY: "%Y%m%d", INTERVAL_MONTH: "%Y%m"}
+# Serializes partition maintenance and the migration to partitions between workers
+ADVISORY_LOCK_KEY = 7_250_001
+
+
+def period_start(moment: datetime, interval: str) -> datetime:
+    start = moment.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    return start.replace(day=1) if interval == INTERVAL_MONTH else start
+
+
+def next_period(start: datetime, interval: str) -> datetime:
+    if interval == INTERVAL_MONTH:
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def partition_name(start: datetime, interval: str) -> str:
+    return f"{TABLE}_p{start.strftime(NAME_FORMATS[interval])}"
+
+
+def partition_start(name: str, interval: str):
+    """Returns the start of a partition from its name, or None for partitions not named by us."""
+    try:
+        return datetime.strptime(name.rsplit("_p", 1)[1], NAME_FORMATS[interval])
+    except (IndexError, ValueError):
+        return None
+
+
+async def is_partitioned(conn) -> bool:
+    relkind = (await conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {"table": TABLE}
+    )).scalar_one_or_none()
+    return relkind == "p"
+
+
+async def existing_partitions(conn):
+    result = await conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(:table)"
+    ), {"table": TABLE})
+    return set(result.scalars().all())
+
+
+async def create_partition(conn, start: datetime, interval: str):
+    """
+    Creates the partition starting at `start`. Rows of its range that went to
+    the default partition meanwhile are moved into it, since the partition
+    can't be attached while the default one still holds them.
+    """
+    name = partition_name(start, interval)
+    end = next_period(start, interval)
+    await conn.execute(text(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)"))
+    await conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= :start AND timestamp < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), {"start": start, "end": end})
+    await conn.execute(text(
+        f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    logger.info(f"Created partition {name} for [{start}, {end})")
+
+
+async def ensure_partitions(conn, start: datetime, end: datetime, interval: str):
+    """Creates the missing partitions covering [start, end), and the default partition."""
+    await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+    existing = await existing_partitions(conn)
+    period = period_start(start, interval)
+    while period < end:
+        if partition_name(period, interval) not in existing:
+            await create_partition(conn, period, interval)
+        period = next_period(period, interval)
+
+
+async def drop_expired_partitions(conn, retention_days: int, interval: str):
+    """Drops every partition whose whole range is older than the retention period."""
+    cutoff = datetime.now() - timedelta(days=retention_days)
+    for name in sorted(await existing_partitions(conn)):
+        start = partition_start(name, interval)
+        if start is not None and next_period(start, interval) <= cutoff:
+            await conn.execute(text(f"DROP TABLE {name}"))
+            logger.info(f"Dropped expired partition {name}")
+    await conn.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp < :cutoff"), {"cutoff": cutoff})
+
+
+async def _needs_migration(conn) -> bool:
+    exists = await conn.scalar(text("SELECT to_regclass(:table)"), {"table": TABLE}) is not None
+    return exists and not await is_partitioned(conn)
+
+
+async def migrate_to_partitioned(conn, interval: str):
+    """
+    Converts a traffic table created before partitioning: the old table is
+    renamed, the partitioned one created, and the rows copied over in the
+    same transaction. Startup takes as long as the copy, once.
+
+    Holds the partition maintenance lock until the transaction ends, so of
+    processes starting together only one migrates; the others find the
+    table partitioned once they get the lock.
+    """
+    if not await _needs_migration(conn):
+        return
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+    if not await _needs_migration(conn):
+        return
+
+    legacy = f"{TABLE}_legacy"
+    logger.warning(f"Converting {TABLE} to a partitioned table, this may take a while")
+    sequence = await conn.scalar(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": TABLE})
+    index_names = (await conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = :table"), {"table": TABLE}
+    )).scalars().all()
+
+    # Index and sequence names are schema-wide, free them for the new table
+    await conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {legacy}"))
+    for index_name in index_names:
+        await conn.execute(text(f"ALTER INDEX {index_name} RENAME TO {index_name}_legacy"))
+    if sequence:
+        await conn.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO {legacy}_id_seq"))
+
+    await conn.run_sync(DBTraffic.__table__.create)
+    oldest, newest = (await conn.execute(text(f"SELECT min(timestamp), max(timestamp) FROM {legacy}"))).one()
+    if oldest is not None:
+        await ensure_partitions(conn, oldest, next_period(period_start(newest, interval), interval), interval)
+
+    columns = ", ".join(column.name for column in DBTraffic.__table__.columns if column.name != "timestamp")
+    await conn.execute(text(
+        f"INSERT INTO {TABLE} ({columns}, timestamp) SELECT {columns}, COALESCE(timestamp, now()) FROM {legacy}"
+    ))
+    await conn.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), COALESCE((SELECT max(id) FROM {TABLE}), 0) + 1, false)"
+    ))
+    await conn.execute(text(f"DROP TABLE {legacy}"))
+    logger.warning(f"Converted {TABLE} to a partitioned table")
+
+
+async def maintain_partitions():
+    """
+    Creates the partitions from the current period up to
+    TRAFFIC_PARTITIONS_AHEAD periods ahead, and applies the retention policy.
+    """
+    interval = settings.TRAFFIC_PARTITION_INTERVAL
+    now = datetime.now()
+    end = now
+    for _ in range(settings.TRAFFIC_PARTITIONS_AHEAD + 1):
+        end = next_period(period_start(end, interval), interval)
+
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+        await ensure_partitions(conn, now, end, interval)
+        if settings.TRAFFIC_RETENTION_DAYS > 0:
+            await drop_expired_partitions(conn, settings.TRAFFIC_RETENTION_DAYS, interval)
+
+
+async def run_partition_maintenance():
+    while True:
+        await asyncio.sleep(settings.TRAFFIC_PARTITION_CHECK_SECONDS)
+        try:
+            await maintain_partitions()
+        except Exception as e:
+            logger.error(f"Partition maintenance failed: {e}")
@@ -0,0 +1,51 @@
+from sqlalchemy import text
+
+from settings import settings
+from database.partitions import migrate_to_partitioned
+from utils.plates import CONFUSION_FROM, CONFUSION_TO
+
+
+# Extensions the models' indexes and queries rely on; must exist before create_all
+EXTENSIONS = ["pg_trgm", "fuzzystrmatch"]
+
+# Idempotent DDL for tables that already exist; create_all only creates missing tables
+UPGRADES = [
+    "ALTER TABLE traffic ADD COLUMN IF NOT EXISTS event_id VARCHAR",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_traffic_event_id ON traffic (event_id)",
+    "ALTER TABLE traffic ADD COLUMN IF NOT EXISTS last_seen TIMESTAMP WITHOUT TIME ZONE",
+    "ALTER TABLE traffic ADD COLUMN IF NOT EXISTS hit_count INTEGER NOT NULL DEFAULT 1",
+    # Would keep the pre-partitioning traffic table alive through the migration
+    "ALTER TABLE IF EXISTS traffic_vehicle_association DROP CONSTRAINT IF EXISTS traffic_vehicle_association_traffic_id_fkey",
+]
+
+
+async def create_extensions(conn):
+    for extension in EXTENSIONS:
+        await conn.execute(text(f"CREATE EXTENSION IF NOT EXISTS {extension}"))
+
+
+async def _column_exists(conn, table: str, column: str) -> bool:
+    return await conn.scalar(text(
+        "SELECT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = :table AND column_name = :column)"
+    ), {"table": table, "column": column})
+
+
+async def _add_plate_normalized(conn):
+    """Adds and backfills traffic.plate_normalized, with the same mapping as normalize_plate."""
+    if await _column_exists(conn, "traffic", "plate_normalized"):
+        return
+    await conn.execute(text("ALTER TABLE traffic ADD COLUMN plate_normalized VARCHAR"))
+    await conn.execute(text(
+        "UPDATE traffic SET plate_normalized = translate(plate_number, :source, :target)"
+    ), {"source": CONFUSION_FROM, "target": CONFUSION_TO})
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_traffic_plate_normalized_trgm ON traffic USING gist (plate_normalized gist_trgm_ops)"
+    ))
+
+
+async def apply_upgrades(conn):
+    """Brings existing tables up to date with the models. Runs after create_all."""
+    for statement in UPGRADES:
+        await conn.execute(text(statement))
+    await _add_plate_normalized(conn)
+    await migrate_to_partitioned(conn, settings.TRAFFIC_PARTITION_INTERVAL)
@@ -1,24 +1,53 @@
+import asyncio
+import logging
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 
 from database.engine import engine, Base, async_session
+from database.upgrades import create_extensions, apply_upgrades
+from database.partitions import maintain_partitions, run_partition_maintenance
 from utils.db_utils import create_default_admin, initialize_defaults
+from tcp.decode_pool import shutdown_executor
+from tcp.traffic_writer import traffic_writer
+from tcp.plate_dedup import plate_deduplicator
+from utils.topology import topology
+from utils.image_store import image_store
+from socket_management import relay_export_progress
+
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("[INFO] Starting lifespan")
+    logger.info("Starting lifespan")
     # Initialize database tables
     async with engine.begin() as conn:
+        await create_extensions(conn)
         await conn.run_sync(Base.metadata.create_all)
-        print("[INFO] Database tables created")
+        await apply_upgrades(conn)
+        logger.info("Database tables created")
 
     async with async_session() as session:
         await create_default_admin(session)
         await initialize_defaults(session)
 
+    await maintain_partitions()
+    partition_maintenance = asyncio.create_task(run_partition_maintenance())
+
+    await topology.load()
+
+    traffic_writer.start()
+    export_progress = asyncio.create_task(relay_export_progress())
+
     yield
 
+    export_progress.cancel()
+    partition_maintenance.cancel()
+    # Open bursts go to the writer, so it stops after them
+    await plate_deduplicator.stop()
+    await traffic_writer.stop()
+    await image_store.close()
+    shutdown_executor()
     await engine.dispose()
-    print("Database connection closed")
-    print("[INFO] Lifespan ended")
+    logger.info("Database connection closed")
+    logger.info("Lifespan ended")
@@ -1,13 +1,18 @@
+from utils.logging_config import setup_logging
+setup_logging()
+
 from tcp import reactor_setup
+import logging
 import threading
 import uvicorn
 import socketio
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 from fastapi.middleware.cors import CORSMiddleware
 
 from lifespan import lifespan
+from utils.image_store import image_store
 from socket_management import sio
 from router.base import include_router
 from router.auth import auth_router
@@ -19,6 +24,7 @@ from router.lpr import lpr_router
 from router.vehicle import vehicle_router
 from router.traffic import traffic_router
 from task_manager.celery_app import celery, add_numbers
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 
 # start_reactor()
 # reactor_setup_func()
@@ -37,12 +43,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-print(f"[DEBUG] Reactor is running in thread: {threading.current_thread().name}")
+logging.getLogger(__name__).debug(f"Reactor is running in thread: {threading.current_thread().name}")
 
 # Directories for images
 BASE_UPLOAD_DIR = Path("uploads")
 PROFILE_IMAGE_DIR = BASE_UPLOAD_DIR / "profile_images"
-PLATE_IMAGE_DIR = BASE_UPLOAD_DIR / "plate_images"
+PLATE_IMAGE_DIR = image_store.root
 # Serve static files for profile and plate images
 app.mount("/uploads/profile_images", StaticFiles(directory=str(PROFILE_IMAGE_DIR)), name="profile_images")
 app.mount("/uploads/plate_images", StaticFiles(directory=str(PLATE_IMAGE_DIR)), name="plate_images")
@@ -65,6 +71,13 @@ async def root():
     """
     return {"message": "Welcome to the Sazman API!"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus metrics for the LPR ingest path and Socket.IO emits.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/add/")
 async def add(a: int, b: int):
     task = add_numbers.delay(a, b)
@@ -14,6 +14,8 @@ camera_lpr_association = Table(
 traffic_vehicle_association = Table(
     "traffic_vehicle_association",
     Base.metadata,
-    Column("traffic_id", Integer, ForeignKey("traffic.id"), primary_key=True),
+    # No foreign key: traffic is partitioned, its ids are only unique together
+    # with the timestamp, and retention drops whole partitions
+    Column("traffic_id", Integer, primary_key=True),
     Column("vehicle_id", Integer, ForeignKey("vehicles.id"), primary_key=True),
 )
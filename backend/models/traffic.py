@@ -1,19 +1,44 @@
-from sqlalchemy import Column, String, Integer, Float,ForeignKey, DateTime, func
+from sqlalchemy import Column, String, Integer, Float,ForeignKey, DateTime, Index, func
 
 from database.engine import Base
 
 
 class DBTraffic(Base):
+    """
+    Range-partitioned on timestamp; the partitions are created and dropped
+    by database.partitions. Unique keys must include the partition key,
+    hence (id, timestamp) and (event_id, timestamp).
+    """
     __tablename__ = "traffic"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     plate_number = Column(String, index=True)
-    timestamp = Column(DateTime, default=func.now())
+    # utils.plates.normalize_plate(plate_number), what plate searches match against
+    plate_normalized = Column(String, nullable=True)
+    timestamp = Column(DateTime, primary_key=True, default=func.now())
+    # A row is one burst of reads of the plate, from timestamp to last_seen (see tcp.plate_dedup)
+    last_seen = Column(DateTime, nullable=True)
+    hit_count = Column(Integer, nullable=False, default=1, server_default="1")
     ocr_accuracy = Column(Float, nullable=True)
     vision_speed = Column(Float, nullable=True)
-    camera_id = Column(Integer, index=True)
-    gate_id = Column(Integer, index=True)
+    camera_id = Column(Integer)
+    gate_id = Column(Integer)
     plate_image_path = Column(String, nullable=True)
+    # Derived from the detection itself, so storing the same plate twice (e.g. on spool replay) is a no-op
+    event_id = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_traffic_timestamp_id", "timestamp", "id"),
+        Index("ix_traffic_camera_id_timestamp", "camera_id", "timestamp"),
+        Index("ix_traffic_gate_id_timestamp", "gate_id", "timestamp"),
+        Index("ix_traffic_event_id", "event_id", "timestamp", unique=True),
+        # Trigram GiST: serves LIKE, similarity (%) and nearest-first ordering (<->) from the index
+        Index(
+            "ix_traffic_plate_normalized_trgm", "plate_normalized",
+            postgresql_using="gist", postgresql_ops={"plate_normalized": "gist_trgm_ops"},
+        ),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
     # gate_id = Column(Integer, ForeignKey("gates.id"), nullable=False)
     # camera_id = Column(Integer, ForeignKey("cameras.id"), nullable=False)
 
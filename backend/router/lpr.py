@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from auth.authorization import get_current_active_user, get_admin_user, get_admin_or_staff_user
@@ -10,6 +10,8 @@ from schema.lpr_setting import LprSettingInstanceCreate, LprSettingInstanceUpdat
 from crud.lpr import LprOperation
 from utils.middlewwares import check_password_changed
 from tcp.tcp_manager import add_connection, update_connection, remove_connection
+from shared_resources import connections, live_slots
+from utils.topology import topology
 
 # Create an APIRouter for user-related routes
 lpr_router = APIRouter(
@@ -57,6 +59,31 @@ async def api_get_lpr_all_cameras(lpr_id: int, page: int = 1, page_size: int = 1
     return await lpr_op.get_lpr_all_cameras(lpr_id, page, page_size)
 
 
+@lpr_router.get("/{lpr_id}/ingest", status_code=status.HTTP_200_OK, dependencies=[Depends(check_password_changed)])
+async def api_get_lpr_ingest_stats(lpr_id: int, current_user: UserInDB = Depends(get_admin_or_staff_user)):
+    """
+    Queue depth and received/dropped counters of the LPR's ingest queue.
+    """
+    factory = connections.get(lpr_id)
+    if factory is None or factory.active_protocol is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f"LPR {lpr_id} is not connected.")
+    return factory.active_protocol.message_queue.stats()
+
+
+@lpr_router.get("/{lpr_id}/live", status_code=status.HTTP_200_OK, dependencies=[Depends(check_password_changed)])
+async def api_get_lpr_live_subscribers(lpr_id: int, current_user: UserInDB = Depends(get_admin_or_staff_user)):
+    """
+    Delivered frame rate and delivered/dropped frame counters of every
+    Socket.IO live subscription to the LPR's cameras.
+    """
+    lpr = topology.lpr(lpr_id)
+    if lpr is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f"LPR {lpr_id} not found.")
+    # Clients may send camera_id as a string; rooms compare it the same way
+    cameras = {str(camera_id) for camera_id in lpr.camera_ids}
+    return [slot.stats() for slot in list(live_slots.values()) if str(slot.camera_id) in cameras]
+
+
 @lpr_router.put("/{lpr_id}", response_model=LprInDB, status_code=status.HTTP_200_OK, dependencies=[Depends(check_password_changed)])
 async def api_update_lpr(
     lpr_id: int,
@@ -1,22 +1,26 @@
-import openpyxl
-import shutil
-from zipfile import ZipFile
-from io import BytesIO
-from fastapi import APIRouter, Depends, status, HTTPException, Query, Request
+from urllib.parse import urlencode
+from fastapi import APIRouter, Depends, status, HTTPException, Query, Request, Path
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-from fastapi.responses import FileResponse
-from pathlib import Path
-from tempfile import TemporaryDirectory
+from typing import Union, Literal
+from fastapi.responses import StreamingResponse, FileResponse
+from celery.result import AsyncResult
 
 
 from settings import settings
 from database.engine import get_db
-from schema.traffic import TrafficCreate, TrafficInDB, TrafficPagination
-from crud.traffic import TrafficOperation
+from schema.traffic import TrafficCreate, TrafficInDB, TrafficPagination, TrafficCursorPagination, TrafficSearch, TrafficExportStatus
+from crud.traffic import TrafficOperation, SEARCH_MODES, SEARCH_FUZZY
 from schema.user import UserInDB
 from auth.authorization import get_admin_user, get_admin_or_staff_user, get_self_or_admin_or_staff_user, get_self_or_admin_user, get_self_user_only
 from utils.middlewwares import check_password_changed
+from utils.image_store import image_store
+from utils.traffic_export import TrafficExport, ColumnarExport, EXPORT_FORMATS, FORMAT_ZIP
+from task_manager.celery_app import celery
+from task_manager.traffic_export import (
+    export_traffic, export_filters, export_key, fresh_artifact, artifact_path, claim_export, release_export,
+    PROGRESS_STATE,
+)
 
 
 # Create an APIRouter for user-related routes
@@ -39,7 +43,7 @@ async def api_create_traffic(
     return await traffic_op.create_traffic(traffic)
 
 
-@traffic_router.get("/", response_model=TrafficPagination, status_code=status.HTTP_200_OK, dependencies=[Depends(check_password_changed)])
+@traffic_router.get("/", response_model=Union[TrafficPagination, TrafficCursorPagination], status_code=status.HTTP_200_OK, dependencies=[Depends(check_password_changed)])
 async def api_get_all_traffic(
     request: Request,
     page: int = Query(1, ge=1, description="Page number to retrieve"),
@@ -49,6 +53,8 @@ async def api_get_all_traffic(
     plate_number: str = Query(None, description="Filter by partial or exact plate number"),
     start_date: datetime = Query(None, description="Filter records from this date (ISO format)"),
     end_date: datetime = Query(None, description="Filter records up to this date (ISO format)"),
+    pagination: Literal["offset", "cursor"] = Query("offset", description="Page by number (with totals) or by cursor (constant time at any depth)"),
+    cursor: str = Query(None, description="next_cursor or prev_cursor of a previous response; implies cursor pagination"),
     db: AsyncSession = Depends(get_db),
     current_user: UserInDB = Depends(get_admin_user)
 ):
@@ -63,26 +69,25 @@ async def api_get_all_traffic(
             camera_id=camera_id,
             plate_number=plate_number,
             start_date=start_date,
-            end_date=end_date
+            end_date=end_date,
+            keyset=pagination == "cursor",
+            cursor=cursor,
         )
     for traffic in result["items"]:
         traffic.plate_image_url = None
         if traffic.plate_image_path:
-            filename = Path(traffic.plate_image_path).name
-            traffic.plate_image_url = f"{request.base_url}uploads/plate_images/{filename}"
+            image_key = image_store.relative_key(traffic.plate_image_path)
+            traffic.plate_image_url = f"{request.base_url}uploads/plate_images/{image_key}"
 
     # Add export URL to the response
-    export_url = f"/v1/traffic/export?page={page}&page_size={page_size}"
-    if gate_id:
-        export_url += f"&gate_id={gate_id}"
-    if camera_id:
-        export_url += f"&camera_id={camera_id}"
-    if plate_number:
-        export_url += f"&plate_number={plate_number}"
-    if start_date:
-        export_url += f"&start_date={start_date.isoformat()}"
-    if end_date:
-        export_url += f"&end_date={end_date.isoformat()}"
+    export_filters = {
+        "gate_id": gate_id,
+        "camera_id": camera_id,
+        "plate_number": plate_number,
+        "start_date": start_date.isoformat() if start_date else None,
+        "end_date": end_date.isoformat() if end_date else None,
+    }
+    export_url = f"/v1/traffic/export?{urlencode({key: value for key, value in export_filters.items() if value})}"
 
     return {
         **result,
@@ -90,29 +95,65 @@ async def api_get_all_traffic(
     }
 
 
+@traffic_router.get("/search", response_model=TrafficSearch, status_code=status.HTTP_200_OK, dependencies=[Depends(check_password_changed)])
+async def api_search_traffic(
+    request: Request,
+    q: str = Query(..., min_length=3, description="Plate number or part of it, as read by the OCR"),
+    mode: Literal[SEARCH_MODES] = Query(SEARCH_FUZZY, description="Match the query as a substring, a prefix, or within a few edits"),
+    max_distance: int = Query(2, ge=0, le=4, description="Maximum number of differing characters in fuzzy mode"),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of results"),
+    camera_id: int = Query(None, description="Filter by camera ID"),
+    start_date: datetime = Query(None, description="Filter records from this date (ISO format)"),
+    end_date: datetime = Query(None, description="Filter records up to this date (ISO format)"),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserInDB = Depends(get_admin_user)
+):
+    """
+    Search plates tolerating OCR errors, best matches first.
+    """
+    traffic_op = TrafficOperation(db)
+    normalized_query, rows = await traffic_op.search_plates(
+        q,
+        mode=mode,
+        max_distance=max_distance,
+        limit=limit,
+        camera_id=camera_id,
+        start_date=start_date,
+        end_date=end_date,
+    )
+    items = []
+    for traffic, similarity in rows:
+        traffic.plate_image_url = None
+        if traffic.plate_image_path:
+            image_key = image_store.relative_key(traffic.plate_image_path)
+            traffic.plate_image_url = f"{request.base_url}uploads/plate_images/{image_key}"
+        items.append({**TrafficInDB.model_validate(traffic).model_dump(), "similarity": similarity})
+
+    return {"query": q, "normalized_query": normalized_query, "mode": mode, "items": items}
+
+
 @traffic_router.get(
     "/export",
     status_code=status.HTTP_200_OK,
-    responses={200: {"content": {"application/zip": {}}}}
+    responses={200: {"content": {"application/zip": {}, "text/csv": {}, "application/vnd.apache.parquet": {}}}}
 )
 async def export_traffic_data(
-    page: int = Query(1, ge=1, description="Page number to retrieve"),
-    page_size: int = Query(10, ge=1, le=100, description="Number of records per page"),
     gate_id: int = Query(None, description="Filter by gate ID"),
     camera_id: int = Query(None, description="Filter by camera ID"),
     plate_number: str = Query(None, description="Filter by partial or exact plate number"),
     start_date: datetime = Query(None, description="Filter records from this date (ISO format)"),
     end_date: datetime = Query(None, description="Filter records up to this date (ISO format)"),
+    export_format: Literal[EXPORT_FORMATS] = Query(FORMAT_ZIP, alias="format", description="ZIP of an Excel file and the plate images, or CSV or Parquet without images"),
     db: AsyncSession = Depends(get_db),
     current_user: UserInDB = Depends(get_admin_user)
 ):
     """
-    Export traffic records to Excel with the same filters as the main API.
+    Export every traffic record matching the same filters as the main API,
+    streamed as it is built: as a ZIP of an Excel file and the plate
+    images, or for large ranges as CSV or Parquet without images.
     """
     traffic_op = TrafficOperation(db)
-    result = await traffic_op.get_all_traffics(
-        page=page,
-        page_size=page_size,
+    query = traffic_op.filter_traffics(
         gate_id=gate_id,
         camera_id=camera_id,
         plate_number=plate_number,
@@ -121,66 +162,109 @@ async def export_traffic_data(
     )
 
     # If no data, raise a 404
-    if not result["items"]:
+    if not await traffic_op.any_traffic(query):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No data found for the given filters.")
 
-    # Create Excel file
-    with TemporaryDirectory() as temp_dir:
-        temp_dir_path = Path(temp_dir)
-
-        # Create the Excel file
-        excel_path = temp_dir_path / "traffic_data.xlsx"
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Traffic Data"
-
-        # Write headers
-        headers = ["ID", "Plate Number", "OCR Accuracy", "Vision Speed", "Timestamp", "Camera ID", "Gate ID"]
-        ws.append(headers)
-
-        # Write data rows
-        for item in result["items"]:
-            ws.append([
-                item.id,
-                item.plate_number,
-                item.ocr_accuracy,
-                item.vision_speed,
-                item.timestamp.isoformat(),
-                item.camera_id,
-                item.gate_id,
-            ])
-
-        wb.save(excel_path)
-
-        # Create the `plate_images` directory
-        plate_images_dir = temp_dir_path / "plate_images"
-        plate_images_dir.mkdir(parents=True, exist_ok=True)
-
-        # Copy the images to the `plate_images` folder
-        for item in result["items"]:
-            if item.plate_image_path:
-                source_image_path = Path(item.plate_image_path)
-                if source_image_path.exists():
-                    destination_image_path = plate_images_dir / source_image_path.name
-                    shutil.copyfile(source_image_path, destination_image_path)
-
-        # Create the zip file
-        zip_file_path = temp_dir_path / "traffic_data.zip"
-        with ZipFile(zip_file_path, "w") as zip_file:
-            # Add the Excel file to the zip
-            zip_file.write(excel_path, arcname="traffic_data.xlsx")
-
-            # Add images to the zip
-            for image_file in plate_images_dir.iterdir():
-                zip_file.write(image_file, arcname=f"plate_images/{image_file.name}")
-
-        # Move the zip file to a persistent location
-        persistent_zip_path = Path(temp_dir).parent / "traffic_data.zip"
-        shutil.move(zip_file_path, persistent_zip_path)
-
-    # Return the zip file as a response
-    return FileResponse(
-        path=persistent_zip_path,
+    if export_format != FORMAT_ZIP:
+        export = ColumnarExport(query, export_format)
+        return StreamingResponse(
+            export.stream(),
+            media_type=export.media_type,
+            headers={"Content-Disposition": f'attachment; filename="traffic_data.{export_format}"'},
+        )
+
+    return StreamingResponse(
+        TrafficExport(query).stream(),
         media_type="application/zip",
-        filename="traffic_data.zip"
+        headers={"Content-Disposition": 'attachment; filename="traffic_data.zip"'},
+    )
+
+
+def _export_status(request: Request, key: str) -> dict:
+    """The state of the background export `key`, with its download URL once finished."""
+    path = fresh_artifact(key)
+    if path is not None:
+        return {
+            "key": key,
+            "state": "SUCCESS",
+            "size": path.stat().st_size,
+            "download_url": f"{request.base_url}v1/traffic/exports/{key}/download",
+        }
+    result = AsyncResult(key, app=celery)
+    status_data = {"key": key, "state": result.state}
+    if result.state == PROGRESS_STATE:
+        status_data.update(done=result.info.get("done"), total=result.info.get("total"))
+    elif result.state == "FAILURE":
+        status_data["error"] = str(result.info)
+    return status_data
+
+
+@traffic_router.post("/exports", response_model=TrafficExportStatus, status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(check_password_changed)])
+def api_create_traffic_export(
+    request: Request,
+    gate_id: int = Query(None, description="Filter by gate ID"),
+    camera_id: int = Query(None, description="Filter by camera ID"),
+    plate_number: str = Query(None, description="Filter by partial or exact plate number"),
+    start_date: datetime = Query(None, description="Filter records from this date (ISO format)"),
+    end_date: datetime = Query(None, description="Filter records up to this date (ISO format)"),
+    current_user: UserInDB = Depends(get_admin_user)
+):
+    """
+    Start a background export of the traffic records matching the filters,
+    or reuse the one already running or finished for the same filters.
+    Progress is available from GET /v1/traffic/exports/{key}, and as
+    export_progress Socket.IO events to clients subscribed to the key.
+    """
+    filters = export_filters(
+        gate_id=gate_id,
+        camera_id=camera_id,
+        plate_number=plate_number,
+        start_date=start_date,
+        end_date=end_date,
     )
+    key = export_key(filters)
+    status_data = _export_status(request, key)
+    if fresh_artifact(key) is not None:
+        return status_data
+    if status_data["state"] in ("FAILURE", "REVOKED"):
+        release_export(key)
+    # Enqueued only by the request that sets the marker; the others report the queued or running task
+    if claim_export(key):
+        # The key doubles as the task id, so a request for the same filters finds the running task
+        AsyncResult(key, app=celery).forget()
+        export_traffic.apply_async((key, filters), task_id=key)
+        status_data = {"key": key, "state": "PENDING"}
+    return status_data
+
+
+@traffic_router.get("/exports/{key}", response_model=TrafficExportStatus, status_code=status.HTTP_200_OK, dependencies=[Depends(check_password_changed)])
+def api_get_traffic_export(
+    request: Request,
+    key: str = Path(..., pattern="^[0-9a-f]{32}$"),
+    current_user: UserInDB = Depends(get_admin_user)
+):
+    """
+    Get the state and progress of a background export.
+    """
+    return _export_status(request, key)
+
+
+@traffic_router.get(
+    "/exports/{key}/download",
+    status_code=status.HTTP_200_OK,
+    responses={200: {"content": {"application/zip": {}}}}
+)
+def api_download_traffic_export(
+    key: str = Path(..., pattern="^[0-9a-f]{32}$"),
+    current_user: UserInDB = Depends(get_admin_user)
+):
+    """
+    Download a finished export. Supports HTTP Range requests, so an
+    interrupted download can be resumed.
+    """
+    path = fresh_artifact(key)
+    if path is None:
+        if artifact_path(key).exists():
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="Export expired; request it again.")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Export not found or not finished.")
+    return FileResponse(path=path, media_type="application/zip", filename="traffic_data.zip")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import TypeVar, Generic, List
+from typing import TypeVar, Generic, List, Optional
 
 
 T = TypeVar('T')
@@ -7,8 +7,20 @@ class Pagination(BaseModel, Generic[T]):
     items: List[T]
     total_records: int
     total_pages: int
+    # False when total_records is the planner's estimate (see utils.counting)
+    total_is_exact: bool = True
     current_page: int
     page_size: int
 
     class Config:
         from_attributes = True
+
+
+class CursorPagination(BaseModel, Generic[T]):
+    items: List[T]
+    page_size: int
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+    class Config:
+        from_attributes = True
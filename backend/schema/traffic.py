@@ -1,9 +1,9 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import Optional, List
 
 # from models.user import UserType
-from schema.pagination import Pagination
+from schema.pagination import Pagination, CursorPagination
 
 
 class TrafficBase(BaseModel):
@@ -13,11 +13,13 @@ class TrafficBase(BaseModel):
     timestamp: datetime
     camera_id: int
     plate_image_path: Optional[str]
+    last_seen: Optional[datetime] = None
+    hit_count: int = 1
     # gate_id: int
 
 
 class TrafficCreate(TrafficBase):
-    pass
+    event_id: Optional[str] = None
 
 class TrafficUpdate(BaseModel):
     pass
@@ -36,3 +38,25 @@ class TrafficInDB(TrafficBase):
 
 
 TrafficPagination = Pagination[TrafficInDB]
+TrafficCursorPagination = CursorPagination[TrafficInDB]
+
+
+class TrafficSearchResult(TrafficInDB):
+    similarity: float
+
+
+class TrafficSearch(BaseModel):
+    query: str
+    normalized_query: str
+    mode: str
+    items: List[TrafficSearchResult]
+
+
+class TrafficExportStatus(BaseModel):
+    key: str
+    state: str
+    done: Optional[int] = None
+    total: Optional[int] = None
+    size: Optional[int] = None
+    download_url: Optional[str] = None
+    error: Optional[str] = None
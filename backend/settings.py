@@ -26,6 +26,49 @@ class Settings(BaseSettings):
     CLIENT_CERT_PATH: str
     CA_CERT_PATH: str
     LPR_AUTH_TOKEN: str
+    LPR_QUEUE_MAX_PENDING: int=1000
+    LPR_TELEMETRY_SAMPLE_SECONDS: float=1.0
+    LPR_PLATES_CONCURRENCY: int=4
+    LPR_LIVE_CONCURRENCY: int=2
+    LPR_DECODE_WORKERS: int=0  # Process pool for large frames, 0 decodes everything on the event loop
+    LPR_DECODE_OFFLOAD_BYTES: int=256 * 1024
+    TRAFFIC_FLUSH_INTERVAL_MS: int=50
+    TRAFFIC_FLUSH_MAX_ROWS: int=500
+    TRAFFIC_WRITER_MAX_PENDING: int=10000
+    TRAFFIC_WRITER_METHOD: str="insert"  # "insert" (returns ids) or "copy"
+    TRAFFIC_WRITE_TIMEOUT_SECONDS: float=5.0
+    TRAFFIC_SPOOL_DIR: str="spool"  # Empty disables the spool
+    TRAFFIC_SPOOL_SEGMENT_BYTES: int=16 * 1024 * 1024
+    TRAFFIC_SPOOL_REPLAY_SECONDS: float=5.0
+    TRAFFIC_PARTITION_INTERVAL: str="month"  # "day" or "month"
+    TRAFFIC_PARTITIONS_AHEAD: int=3
+    TRAFFIC_PARTITION_CHECK_SECONDS: float=3600.0
+    TRAFFIC_RETENTION_DAYS: int=0  # 0 keeps traffic forever
+    TOPOLOGY_REFRESH_SECONDS: float=300.0
+    COUNT_STRATEGY: str="auto"
+    COUNT_EXACT_MAX_ROWS: int=100000
+    COUNT_CACHE_SECONDS: float=10.0
+    COUNT_CACHE_MAX_ENTRIES: int=1024
+    CELERY_BROKER_URL: str="redis://redis:6379/0"
+    EXPORT_DIR: str="exports"
+    EXPORT_CACHE_SECONDS: float=3600.0
+    EXPORT_RETENTION_SECONDS: float=86400.0
+    EXPORT_PROGRESS_CHANNEL: str="traffic_export_progress"
+    # Groups of characters OCR confuses with each other; each folds into its first character
+    PLATE_CONFUSION_GROUPS: str=(
+        "0۰٠,1۱١,2۲٢,3۳٣,4۴٤,5۵٥,6۶٦,7۷٧,8۸٨,9۹٩,"
+        "یيى,کك,هةۀ,بپتث,جچحخ,دذ,رزژ,سش,صض,طظ,عغ,فق,اأإآ"
+    )
+    PLATE_IGNORED_CHARS: str=" -_|"
+    PLATE_DEDUP_WINDOW_SECONDS: float=0.0  # Merge repeated reads of a plate within this many seconds; 0 disables
+    PLATE_DEDUP_MAX_SECONDS: float=30.0
+    PLATE_IMAGE_DIR: str="uploads/plate_images"
+    IMAGE_STORE_WORKERS: int=4
+    IMAGE_STORE_FSYNC_INTERVAL_MS: int=1000
+    LOG_LEVEL: str="INFO"
+    LOG_LEVELS: str="socketio=WARNING,engineio=WARNING"  # Per-logger overrides, e.g. "tcp=DEBUG,socket_management=WARNING"
+    LOG_SAMPLE_SECONDS: float=10.0
+    DB_ECHO: bool=False
 
 
     class Config:
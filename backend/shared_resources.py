@@ -1 +1,2 @@
 connections = {}
+live_slots = {}  # (sid, room) -> socket_management.LiveSlot of each live subscription
@@ -1,13 +1,18 @@
+import json
 import time
 import socketio
 import logging
 import asyncio
-from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
+import redis.asyncio as redis
+from engineio import packet as eio_packet
+from socketio import packet as sio_packet
 
-from database.engine import async_session
-from models.camera import DBCamera
-from shared_resources import connections
+from settings import settings
+
+from shared_resources import connections, live_slots
+from utils.metrics import EMIT_LATENCY, LIVE_FRAMES
+from utils.logging_config import preview
+from utils.topology import topology
 
 logger = logging.getLogger(__name__)
 
@@ -15,19 +20,32 @@ logger = logging.getLogger(__name__)
 sio = socketio.AsyncServer(
     async_mode="asgi",  # Use ASGI mode for FastAPI compatibility
     cors_allowed_origins="*",  # Allow all origins for CORS; adjust as needed
-    logger=True,
-    engineio_logger=True,
+    logger=logging.getLogger("socketio"),
+    engineio_logger=logging.getLogger("engineio"),
 )
 
-# Maps to manage client subscriptions
+# Maps to manage client subscriptions; emits go to the matching rooms (see subscription_room)
 request_map = {
     "live": {},  # Format: {"sid": {cameraID1, cameraID2, ...}}
     "plates_data": {},  # Format: {"sid": {cameraID1, cameraID2, ...}}
     "resources": set(),
     "heartbeat": {},  # heartbeat don't require camera IDs
     "camera_connection": {},  # camera_connection don't require camera IDs
+    "export_progress": {},  # Format: {"sid": {exportKey1, ...}}
 }
 
+# Events subscribed to per camera (or per export), and events without a key
+KEYED_EVENTS = ("live", "plates_data", "export_progress")
+UNKEYED_EVENTS = ("heartbeat", "camera_connection")
+
+# Events where only the latest frame matters: slow clients skip frames instead of queuing them (see LiveSlot)
+LATEST_FRAME_EVENTS = ("live",)
+# Window over which the delivered frame rate of a live subscriber is measured
+FPS_WINDOW_SECONDS = 5.0
+
+# All events go through the default namespace
+NAMESPACE = "/"
+
 sid_role_map = {}  # Maps SID to roles (e.g., {"sid1": "admin", "sid2": "operator"})
 
 @sio.event
@@ -35,7 +53,7 @@ async def connect(sid, environ):
     """
     Event triggered when a client connects to the WebSocket.
     """
-    print(f"New client connected: {sid}")
+    logger.info(f"New client connected: {sid}")
     await sio.emit("connection_ack", {"message": "Connected"}, to=sid)
     logger.info(f"Client connected: {sid}")
     request_map["live"][sid] = set()
@@ -45,11 +63,24 @@ async def connect(sid, environ):
 async def disconnect(sid):
     """
     Event triggered when a client disconnects from the WebSocket.
+    Socket.IO removes the client from its rooms itself.
     """
     logger.info(f"Client disconnected: {sid}")
     sid_role_map.pop(sid, None)
-    request_map["live"].pop(sid, None)
-    request_map["plates_data"].pop(sid, None)
+    request_map["resources"].discard(sid)
+    for request_type in KEYED_EVENTS + UNKEYED_EVENTS:
+        request_map[request_type].pop(sid, None)
+    for key in [key for key in live_slots if key[0] == sid]:
+        live_slots.pop(key).close()
+
+
+def subscription_room(event_name, key=None):
+    """
+    The room of the clients subscribed to an event, for one camera (or
+    export) when `key` is given, or to every camera otherwise.
+    """
+    return event_name if key is None else f"{event_name}:{key}"
+
 
 @sio.event
 async def subscribe(sid, data):
@@ -57,7 +88,7 @@ async def subscribe(sid, data):
     Allows clients to subscribe to specific events.
     """
     global connections
-    print(f"Received subscription request from {sid}: {data}")
+    logger.info(f"Received subscription request from {sid}: {preview(data)}")
 
     request_type = data.get("request_type")
     camera_id = data.get("camera_id")
@@ -68,20 +99,27 @@ async def subscribe(sid, data):
 
     if request_type == "resources":
         request_map["resources"].add(sid)
+        await sio.enter_room(sid, subscription_room(request_type))
         logger.info(f"Client {sid} subscribed to resources")
         await sio.emit("request_acknowledged", {"status": "subscribed", "data_type": "resources"}, to=sid)
         return
 
-    if request_type == "heartbeat":
-        request_map["heartbeat"].setdefault(sid, set())
-        logger.info(f"Client {sid} subscribed to heartbeat data")
-        await sio.emit('request_acknowledged', {"status": "subscribed", "data_type": "heartbeat"}, to=sid)
+    if request_type in UNKEYED_EVENTS:
+        request_map[request_type].setdefault(sid, set())
+        await sio.enter_room(sid, subscription_room(request_type))
+        logger.info(f"Client {sid} subscribed to {request_type} data")
+        await sio.emit('request_acknowledged', {"status": "subscribed", "data_type": request_type}, to=sid)
         return
 
-    if request_type == "camera_connection":
-        request_map["camera_connection"].setdefault(sid, set())
-        logger.info(f"Client {sid} subscribed to camera_connection data")
-        await sio.emit('request_acknowledged', {"status": "subscribed", "data_type": "camera_connection"}, to=sid)
+    if request_type == "export_progress":
+        key = data.get("key")
+        if not key:
+            await sio.emit("error", {"message": "key is required"}, to=sid)
+            return
+        request_map["export_progress"].setdefault(sid, set()).add(key)
+        await sio.enter_room(sid, subscription_room(request_type, key))
+        logger.info(f"Client {sid} subscribed to progress of export {key}")
+        await sio.emit("request_acknowledged", {"status": "subscribed", "data_type": "export_progress", "key": key}, to=sid)
         return
 
     if not camera_id:
@@ -89,6 +127,14 @@ async def subscribe(sid, data):
         return
 
     request_map[request_type].setdefault(sid, set()).add(camera_id)
+    # One room per camera for emits about it, one per event for emits about every camera
+    await sio.enter_room(sid, subscription_room(request_type, camera_id))
+    await sio.enter_room(sid, subscription_room(request_type))
+
+    if request_type in LATEST_FRAME_EVENTS:
+        room = subscription_room(request_type, camera_id)
+        if (sid, room) not in live_slots:
+            live_slots[(sid, room)] = LiveSlot(sid, sio.manager.eio_sid_from_sid(sid, NAMESPACE), camera_id)
 
     if request_type == "live":
         await _handle_camera_subscription(sid, camera_id, request_type, data)
@@ -109,28 +155,32 @@ async def unsubscribe(sid, data):
         await sio.emit("error", {"message": "Invalid request_type"}, to=sid)
         return
 
-    if request_type == "heartbeat":
-        request_map["heartbeat"].discard(sid)
-        logger.info(f"Client {sid} unsubscribed from heartbeat")
-        await sio.emit("request_acknowledged", {"status": "unsubscribed", "data_type": "heartbeat"}, to=sid)
-        return
-
     if request_type == "resources":
         request_map["resources"].discard(sid)
+        await sio.leave_room(sid, subscription_room(request_type))
         logger.info(f"Client {sid} unsubscribed from resources")
         await sio.emit("request_acknowledged", {"status": "unsubscribed", "data_type": "resources"}, to=sid)
         return
 
-    if request_type == "camera_connection":
-        request_map["camera_connection"].discard(sid)
-        logger.info(f"Client {sid} unsubscribed from camera_connection")
-        await sio.emit("request_acknowledged", {"status": "unsubscribed", "data_type": "camera_connection"}, to=sid)
+    if request_type in UNKEYED_EVENTS:
+        request_map[request_type].pop(sid, None)
+        await sio.leave_room(sid, subscription_room(request_type))
+        logger.info(f"Client {sid} unsubscribed from {request_type}")
+        await sio.emit("request_acknowledged", {"status": "unsubscribed", "data_type": request_type}, to=sid)
         return
 
+    if request_type == "export_progress":
+        camera_id = data.get("key")
+
     if sid in request_map[request_type]:
         request_map[request_type][sid].discard(camera_id)
+        await sio.leave_room(sid, subscription_room(request_type, camera_id))
+        slot = live_slots.pop((sid, subscription_room(request_type, camera_id)), None)
+        if slot is not None:
+            slot.close()
         if not request_map[request_type][sid]:
             del request_map[request_type][sid]
+            await sio.leave_room(sid, subscription_room(request_type))
         logger.info(f"Client {sid} unsubscribed from {request_type} for camera_id {camera_id}")
         await sio.emit("request_acknowledged", {"status": "unsubscribed", "data_type": request_type, "camera_id": camera_id}, to=sid)
 
@@ -142,64 +192,222 @@ async def _handle_camera_subscription(sid, camera_id, request_type, data):
         "cameraId": camera_id,
         "duration": data.get("duration"),
     }
-    async with async_session() as session:
-        query = await session.execute(
-            select(DBCamera).where(DBCamera.id == int(camera_id)).options(selectinload(DBCamera.lpr))
-        )
-        db_camera = query.scalar_one_or_none()
-
-        if not db_camera:
-            await sio.emit("error", {"message": "camera not found"}, to=sid)
-            return
+    camera = topology.camera(int(camera_id))
+    if not camera:
+        await sio.emit("error", {"message": "camera not found"}, to=sid)
+        return
 
-        lpr = db_camera.lpr
-        if lpr and lpr.is_active:
-            print(f"lpr: {lpr.id}")
-            print(f"connections are {connections}")
-            if lpr.id in connections:
-                factory = connections[lpr.id]
-                if factory.authenticated and factory.active_protocol:
-                    print(f"[INFO] Sending command to server: {command_data}")
-                    factory.active_protocol.send_command(command_data)
-                else:
-                    print("[ERROR] Cannot send command: Client is not authenticated or connected.")
+    lpr = topology.lpr(camera.lpr_id)
+    if lpr and lpr.is_active:
+        logger.info(f"lpr: {lpr.lpr_id}")
+        logger.debug(f"connections are {connections}")
+        if lpr.lpr_id in connections:
+            factory = connections[lpr.lpr_id]
+            if factory.authenticated and factory.active_protocol:
+                logger.info(f"Sending command to server: {preview(command_data)}")
+                factory.active_protocol.send_command(command_data)
             else:
-                print(f"[ERROR] No connection for LPR ID {lpr.id}")
+                logger.error("Cannot send command: Client is not authenticated or connected.")
+        else:
+            logger.error(f"No connection for LPR ID {lpr.lpr_id}")
 
     logger.info(f"Client {sid} subscribed to live data for camera_id {camera_id}")
     await sio.emit("request_acknowledged", {"status": "subscribed", "data_type": request_type, "camera_id": camera_id}, to=sid)
 
 
+def _encode_event(event_name, data):
+    """
+    Encodes an event into the Engine.IO packets that carry it, once for any
+    number of recipients. Text packets are encoded up front and keep the
+    result (Packet.encode caches it), so each socket's writer sends the same
+    string. Binary attachments are not encoded here: polling sends them
+    base64 and WebSocket as is, so each socket gets its own Packet over the
+    same bytes.
+    """
+    encoded = sio.packet_class(sio_packet.EVENT, namespace=NAMESPACE, data=[event_name, data]).encode()
+    if not isinstance(encoded, list):
+        encoded = [encoded]
+    packets = []
+    for part in encoded:
+        pkt = eio_packet.Packet(eio_packet.MESSAGE, part)
+        if not pkt.binary:
+            pkt.encode()
+        packets.append(pkt)
+    return packets
+
+
+async def _queue_packets(socket, packets) -> bool:
+    """Queues packets from _encode_event on an Engine.IO socket, returning whether the socket took them."""
+    if socket is None or socket.closed:
+        return False
+    # Closes the socket of a client that stopped answering pings, as AsyncSocket.send does
+    if not await socket.check_ping_timeout():
+        return False
+    for pkt in packets:
+        socket.queue.put_nowait(pkt if not pkt.binary else eio_packet.Packet(eio_packet.MESSAGE, pkt.data))
+    return True
+
+
+class LiveSlot:
+    """
+    Latest-frame slot of one live subscription (a client and a camera).
+
+    A frame is handed to the client's Engine.IO socket only once the socket
+    has taken the previous one (its writer polled the queue, which happens
+    after the frame before that was written out). Until then the frame
+    waits here, and a newer one replaces it and counts as dropped, so a slow
+    client gets fewer frames instead of a growing backlog: the server holds
+    at most one waiting, one queued and one being written per subscription,
+    all shared with the other subscribers of the camera.
+    """
+
+    def __init__(self, sid, eio_sid, camera_id):
+        self.sid = sid
+        self.eio_sid = eio_sid
+        self.camera_id = camera_id
+        self.pending = None
+        self.in_flight = False
+        self.delivered = 0
+        self.dropped = 0
+        self._fps = 0.0
+        self._window_start = time.monotonic()
+        self._window_delivered = 0
+        self._delivered_frames = LIVE_FRAMES.labels(str(camera_id), "delivered")
+        self._dropped_frames = LIVE_FRAMES.labels(str(camera_id), "dropped")
+        self._ready = asyncio.Event()
+        self._task = asyncio.ensure_future(self._deliver())
+
+    def offer(self, packets):
+        if self.pending is not None:
+            self.dropped += 1
+            self._dropped_frames.inc()
+        self.pending = packets
+        self._ready.set()
+
+    def fps(self) -> float:
+        """Frames delivered per second over the last FPS_WINDOW_SECONDS."""
+        elapsed = time.monotonic() - self._window_start
+        if elapsed >= FPS_WINDOW_SECONDS:
+            return self._window_delivered / elapsed
+        return self._fps
+
+    def stats(self):
+        return {
+            "sid": self.sid,
+            "camera_id": self.camera_id,
+            "fps": round(self.fps(), 1),
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "in_flight": self.in_flight,
+        }
+
+    def close(self):
+        self._task.cancel()
+        self.pending = None
+
+    async def _deliver(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            packets, self.pending = self.pending, None
+            socket = sio.eio.sockets.get(self.eio_sid)
+            if not await _queue_packets(socket, packets):
+                # The socket is gone; disconnect closes the slot
+                return
+            self.in_flight = True
+            await socket.queue.join()
+            self.in_flight = False
+            self._delivered()
+
+    def _delivered(self):
+        self.delivered += 1
+        self._delivered_frames.inc()
+        now = time.monotonic()
+        if now - self._window_start >= FPS_WINDOW_SECONDS:
+            self._fps = self._window_delivered / (now - self._window_start)
+            self._window_start, self._window_delivered = now, 0
+        self._window_delivered += 1
+
+
+def offer_latest(event_name, data, room):
+    """
+    Offers an event to the LiveSlot of every client in `room`, encoded once.
+    Returns the number of slots it was offered to.
+    """
+    slots = [
+        live_slots[(sid, room)]
+        for sid, _ in sio.manager.get_participants(NAMESPACE, room)
+        if (sid, room) in live_slots
+    ]
+    if slots:
+        packets = _encode_event(event_name, data)
+        for slot in slots:
+            slot.offer(packets)
+    return len(slots)
+
+
+async def broadcast(event_name, data, room):
+    """
+    Sends an event to every client in `room`, serializing it once: the same
+    encoded packets are queued on each client's Engine.IO socket, without a
+    task per recipient, so the cost of a large payload (a full_image or a
+    live frame) doesn't grow with the number of subscribers.
+
+    Returns the number of clients the event was queued for.
+    """
+    participants = list(sio.manager.get_participants(NAMESPACE, room))
+    if not participants:
+        return 0
+
+    packets = _encode_event(event_name, data)
+    sent = 0
+    for _, eio_sid in participants:
+        if await _queue_packets(sio.eio.sockets.get(eio_sid), packets):
+            sent += 1
+    return sent
+
+
 async def emit_to_requested_sids(event_name, data, camera_id=None):
     """
-    Emits an event with data to all clients subscribed to the event.
+    Emits an event with data to all clients subscribed to the event, for
+    `camera_id` when given. Subscribers are kept in Socket.IO rooms and the
+    event is broadcast to the room, encoded once whatever its size. Live
+    frames go through each subscriber's LiveSlot instead, so clients that
+    can't keep up skip frames.
     """
     if event_name not in request_map:
         logger.error(f"Invalid event name: {event_name}")
         return
 
-    if event_name == "resources":
-        for sid in request_map["resources"]:
-            await sio.emit(event_name, data, to=sid)
-
-    elif event_name == "heartbeat":
-        for sid in request_map[event_name]:
-            asyncio.create_task(sio.emit(event_name, data, to=sid))
-        logger.info(f"Emitted heartbeat to all subscribed clients")
-
-    elif event_name == "camera_connection":
-        for sid in request_map[event_name]:
-            asyncio.create_task(sio.emit(event_name, data, to=sid))
-        logger.info(f"Emitted camera_connection to all subscribed clients")
-
+    start = time.perf_counter()
+    room = subscription_room(event_name, camera_id)
+    if event_name in LATEST_FRAME_EVENTS and camera_id is not None:
+        sent = offer_latest(event_name, data, room)
     else:
-        tasks = []
-        for sid, camera_ids in request_map[event_name].items():
-            if camera_id is None or camera_id in camera_ids:
-                tasks.append(asyncio.create_task(sio.emit(event_name, data, to=sid)))
-                logger.info(f"Emitted {event_name} to SID {sid} for camera_id {camera_id}")
+        sent = await broadcast(event_name, data, room)
+    EMIT_LATENCY.labels(event_name).observe(time.perf_counter() - start)
+    logger.debug(f"Emitted {event_name} to {sent} subscribed clients of camera_id {camera_id}")
 
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
 
-    logger.info(f"Emitted {event_name} to all subscribed clients")
+async def relay_export_progress():
+    """
+    Relays the progress that export workers publish on
+    EXPORT_PROGRESS_CHANNEL to the clients subscribed to each export.
+    """
+    client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+    while True:
+        try:
+            async with client.pubsub() as pubsub:
+                await pubsub.subscribe(settings.EXPORT_PROGRESS_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    data = json.loads(message["data"])
+                    # Subscriptions to export_progress are keyed by export key where others use camera IDs
+                    await emit_to_requested_sids("export_progress", data, data.get("key"))
+        except asyncio.CancelledError:
+            await client.close()
+            raise
+        except Exception as e:
+            logger.warning(f"Export progress relay failed, retrying: {e}")
+            await asyncio.sleep(5)
@@ -1,10 +1,13 @@
 from celery import Celery
 
+from settings import settings
+
 # Configure the Celery app
 celery = Celery(
     "sazman_tasks",
-    broker="redis://redis:6379/0",  # Redis as the message broker
-    backend="redis://redis:6379/0",  # Redis as the result backend
+    broker=settings.CELERY_BROKER_URL,  # Redis as the message broker
+    backend=settings.CELERY_BROKER_URL,  # Redis as the result backend
+    include=["task_manager.traffic_export"],
 )
 
 # Celery configuration
@@ -14,6 +17,8 @@ celery.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
+    # Report STARTED, so a running export can be told from an unknown one
+    task_track_started=True,
 )
 
 @celery.task
@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from datetime import datetime
+
+import redis
+from sqlalchemy import func, select
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from settings import settings
+from task_manager.celery_app import celery
+from database.engine import DATABASE_URL
+from crud.traffic import TrafficOperation
+from utils.traffic_export import TrafficArchive, EXPORT_COLUMNS, FETCH_ROWS
+from models.traffic import DBTraffic
+
+logger = logging.getLogger(__name__)
+
+
+EXPORT_ROOT = Path(settings.EXPORT_DIR)
+FILTER_NAMES = ("gate_id", "camera_id", "plate_number", "start_date", "end_date")
+PROGRESS_STATE = "PROGRESS"
+# Progress is reported at most this often
+PROGRESS_INTERVAL_SECONDS = 1.0
+# Redis key marking an export as queued or running, so it is enqueued once
+MARKER_KEY = "traffic_export:{key}"
+
+_redis = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+
+
+def export_filters(**filters) -> dict:
+    """
+    Canonical form of the export filters: what the task receives, and what
+    the artifact key is computed from, so equivalent requests share one.
+    """
+    canonical = {}
+    for name in FILTER_NAMES:
+        value = filters.get(name)
+        if value is None:
+            continue
+        if isinstance(value, datetime):
+            value = value.replace(tzinfo=None).isoformat()
+        canonical[name] = value
+    return canonical
+
+
+def export_key(filters: dict) -> str:
+    return hashlib.sha256(json.dumps(filters, sort_keys=True).encode()).hexdigest()[:32]
+
+
+def artifact_path(key: str) -> Path:
+    return EXPORT_ROOT / f"traffic_{key}.zip"
+
+
+def fresh_artifact(key: str):
+    """Returns the path of the finished export for `key` if it is recent enough to serve, else None."""
+    path = artifact_path(key)
+    try:
+        if time.time() - path.stat().st_mtime <= settings.EXPORT_CACHE_SECONDS:
+            return path
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def claim_export(key: str) -> bool:
+    """
+    Marks the export `key` as queued, returning False if it already is.
+    Celery reports PENDING for queued and unknown tasks alike, so this marker
+    is what tells them apart. It expires after EXPORT_CACHE_SECONDS in case
+    a worker dies without clearing it.
+    """
+    return bool(_redis.set(MARKER_KEY.format(key=key), 1, nx=True, ex=settings.EXPORT_CACHE_SECONDS))
+
+
+def release_export(key: str):
+    _redis.delete(MARKER_KEY.format(key=key))
+
+
+def _remove_expired():
+    for path in EXPORT_ROOT.glob("traffic_*"):
+        try:
+            if time.time() - path.stat().st_mtime > settings.EXPORT_RETENTION_SECONDS:
+                path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class ProgressReporter:
+    """
+    Reports export progress to the task result (PROGRESS state), and with
+    the final state to EXPORT_PROGRESS_CHANNEL, which the API relays to
+    Socket.IO subscribers of the export.
+    """
+
+    def __init__(self, task, key: str):
+        self.task = task
+        self.key = key
+        self.redis = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+        self._reported = 0.0
+
+    def progress(self, done: int, total: int, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._reported < PROGRESS_INTERVAL_SECONDS:
+            return
+        self._reported = now
+        meta = {"key": self.key, "done": done, "total": total}
+        self.task.update_state(state=PROGRESS_STATE, meta=meta)
+        self.publish(PROGRESS_STATE, **meta)
+
+    def publish(self, state: str, **meta):
+        try:
+            self.redis.publish(settings.EXPORT_PROGRESS_CHANNEL, json.dumps({"key": self.key, "state": state, **meta}))
+        except redis.RedisError as e:
+            logger.warning(f"Failed to publish export progress: {e}")
+
+
+async def _write_export(key: str, filters: dict, progress: ProgressReporter) -> int:
+    """
+    Writes the export to a temporary file next to the artifact and renames
+    it into place once complete, so a partial archive is never served.
+    """
+    query = TrafficOperation(None).filter_traffics(
+        **{name: datetime.fromisoformat(value) if name.endswith("_date") else value for name, value in filters.items()}
+    )
+    path = artifact_path(key)
+    temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+
+    # A pool from another event loop can't be reused; each run gets its own connection
+    engine = create_async_engine(DATABASE_URL, poolclass=NullPool)
+    try:
+        async with engine.connect() as conn:
+            total = await conn.scalar(select(func.count()).select_from(query.subquery()))
+            progress.progress(0, total, force=True)
+            done = 0
+            with open(temp_path, "wb") as output:
+                archive = TrafficArchive(output)
+                try:
+                    result = await conn.stream(
+                        query.with_only_columns(*EXPORT_COLUMNS)
+                        .order_by(DBTraffic.timestamp, DBTraffic.id)
+                        .execution_options(yield_per=FETCH_ROWS)
+                    )
+                    async for row in result:
+                        archive.add(tuple(row))
+                        done += 1
+                        progress.progress(done, total)
+                    archive.close()
+                except BaseException:
+                    archive.discard()
+                    raise
+                os.fsync(output.fileno())
+        os.replace(temp_path, path)
+        return done
+    finally:
+        temp_path.unlink(missing_ok=True)
+        await engine.dispose()
+
+
+@celery.task(bind=True)
+def export_traffic(self, key: str, filters: dict):
+    """
+    Builds the traffic export for `filters` into EXPORT_DIR, reporting
+    progress on the way, unless a recent enough one already exists.
+    """
+    EXPORT_ROOT.mkdir(parents=True, exist_ok=True)
+    progress = ProgressReporter(self, key)
+    try:
+        if fresh_artifact(key) is None:
+            _remove_expired()
+            rows = asyncio.run(_write_export(key, filters, progress))
+            logger.info(f"Exported {rows} traffic records to {artifact_path(key)}")
+        size = artifact_path(key).stat().st_size
+    except Exception as e:
+        progress.publish("FAILURE", error=str(e))
+        raise
+    finally:
+        release_export(key)
+    progress.publish("SUCCESS", size=size)
+    return {"key": key, "size": size}
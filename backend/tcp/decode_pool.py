@@ -0,0 +1,72 @@
+import logging
+import base64
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from settings import settings
+from tcp.messages import decode_message, PlatesData
+
+logger = logging.getLogger(__name__)
+
+
+_executor = None
+
+
+def get_executor():
+    """
+    Returns the process pool used to decode large frames, creating it on first
+    use. Returns None when offloading is disabled (LPR_DECODE_WORKERS=0).
+    """
+    global _executor
+    if _executor is None and settings.LPR_DECODE_WORKERS > 0:
+        # spawn: forking a process that runs the event loop and the reactor is unsafe
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.LPR_DECODE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        logger.info(f"Started frame decode pool with {settings.LPR_DECODE_WORKERS} workers")
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def decode_frame_sync(header, blobs=()):
+    """
+    Decodes a frame and, for plates_data, the plate images it carries.
+
+    Returns (message, plate_images) where plate_images holds the raw bytes of
+    each car's plate image (None if it has none) for plates_data messages and
+    is None for every other message type.
+    """
+    message = decode_message(header, blobs)
+    plate_images = None
+    if isinstance(message, PlatesData):
+        plate_images = []
+        for car in message.message_body.cars:
+            image = car.plate.plate_image
+            plate_images.append(base64.b64decode(image) if isinstance(image, str) and image else image or None)
+    return message, plate_images
+
+
+async def decode_frame(header, blobs=()):
+    """
+    Decodes a frame inline, or in the process pool when offloading is enabled
+    and the frame is at least LPR_DECODE_OFFLOAD_BYTES long. Small control
+    messages always stay on the event loop.
+    """
+    executor = get_executor()
+    size = len(header) + sum(len(blob) for blob in blobs)
+    if executor is None or size < settings.LPR_DECODE_OFFLOAD_BYTES:
+        return decode_message(header, blobs), None
+
+    loop = asyncio.get_running_loop()
+    # memoryviews can't be pickled; this copy is what the worker receives anyway
+    return await loop.run_in_executor(
+        executor, decode_frame_sync, bytes(header), [bytes(blob) for blob in blobs]
+    )
@@ -0,0 +1,178 @@
+import struct
+from collections import deque
+from typing import NamedTuple
+
+
+# Protocol versions negotiated with the LPR module during authentication
+PROTOCOL_DELIMITED = 1  # JSON frames terminated by <END>
+PROTOCOL_LENGTH_PREFIXED = 2  # Binary header + payload length, no delimiter scanning
+SUPPORTED_PROTOCOLS = (PROTOCOL_LENGTH_PREFIXED, PROTOCOL_DELIMITED)
+
+# Header of a length-prefixed frame: frame type (1 byte) + payload length (4 bytes, big-endian)
+FRAME_HEADER = struct.Struct(">BI")
+FRAME_TYPE_JSON = 0x01
+# Compact JSON header followed by raw binary blobs (JPEG images), each prefixed
+# with BLOB_LENGTH. JSON fields reference a blob as {"blob": <index>} (see tcp.messages.BlobRef).
+FRAME_TYPE_JSON_WITH_BLOBS = 0x02
+BLOB_LENGTH = struct.Struct(">I")
+
+
+class Frame(NamedTuple):
+    frame_type: int
+    payload: bytes
+
+
+def encode_frame(payload: bytes, frame_type: int = FRAME_TYPE_JSON) -> bytes:
+    """Prefixes a payload with a length-prefixed frame header."""
+    return FRAME_HEADER.pack(frame_type, len(payload)) + payload
+
+
+def encode_blob_frame(header: bytes, blobs) -> bytes:
+    """Builds a FRAME_TYPE_JSON_WITH_BLOBS frame from a JSON header and its blobs."""
+    parts = [BLOB_LENGTH.pack(len(header)), header]
+    for blob in blobs:
+        parts.append(BLOB_LENGTH.pack(len(blob)))
+        parts.append(blob)
+    return encode_frame(b"".join(parts), FRAME_TYPE_JSON_WITH_BLOBS)
+
+
+def split_blobs(payload):
+    """
+    Splits a FRAME_TYPE_JSON_WITH_BLOBS payload into its JSON header and blobs.
+    Both are returned as memoryviews over the payload, so nothing is copied.
+    """
+    view = memoryview(payload)
+    blobs = []
+    pos = 0
+    header = None
+    while pos < len(view):
+        if pos + BLOB_LENGTH.size > len(view):
+            raise ValueError("Truncated blob length in frame")
+        (length,) = BLOB_LENGTH.unpack_from(view, pos)
+        pos += BLOB_LENGTH.size
+        if pos + length > len(view):
+            raise ValueError("Blob length exceeds frame payload")
+        if header is None:
+            header = view[pos:pos + length]
+        else:
+            blobs.append(view[pos:pos + length])
+        pos += length
+    if header is None:
+        raise ValueError("Frame has no JSON header")
+    return header, blobs
+
+
+class DelimitedFrameDecoder:
+    """
+    Splits a byte stream into frames separated by a delimiter.
+
+    Incoming chunks are appended to a single ``bytearray`` and the delimiter
+    search resumes from where the previous search stopped, so each byte is
+    scanned once no matter how many chunks a frame is split into. Frames are
+    returned as ``bytes`` and only decoded by the caller once complete, which
+    keeps multi-byte UTF-8 characters split across chunks intact.
+    """
+
+    def __init__(self, delimiter: bytes = b"<END>", max_length: int = 500 * 1024 * 1024):
+        self.delimiter = delimiter
+        self.max_length = max_length
+        self._buffer = bytearray()
+        self._start = 0  # Offset of the first unconsumed byte
+        self._scan_from = 0  # Offset where the next delimiter search begins
+
+    def feed(self, data: bytes):
+        """Appends a received chunk to the buffer."""
+        self._buffer += data
+
+    def next_frame(self):
+        """
+        Returns the next complete Frame, or None if more data is needed.
+        Empty frames (e.g. stray whitespace between delimiters) are skipped.
+        """
+        while True:
+            end = self._buffer.find(self.delimiter, self._scan_from)
+            if end == -1:
+                # Resume just before the tail, in case the delimiter is split across chunks
+                self._scan_from = max(self._start, len(self._buffer) - len(self.delimiter) + 1)
+                if len(self._buffer) - self._start > self.max_length:
+                    raise ValueError(f"Frame exceeds maximum length of {self.max_length} bytes")
+                self._compact()
+                return None
+
+            frame = bytes(memoryview(self._buffer)[self._start:end]).strip()
+            self._start = self._scan_from = end + len(self.delimiter)
+            if frame:
+                return Frame(FRAME_TYPE_JSON, frame)
+
+    def take_remaining(self) -> bytes:
+        """Returns and clears any buffered bytes that are not part of a returned frame."""
+        remaining = bytes(self._buffer[self._start:])
+        self._buffer.clear()
+        self._start = self._scan_from = 0
+        return remaining
+
+    def buffered(self) -> int:
+        """Number of bytes waiting for the rest of their frame."""
+        return len(self._buffer) - self._start
+
+    def _compact(self):
+        # Drop consumed bytes in one go instead of on every frame
+        if self._start:
+            del self._buffer[:self._start]
+            self._scan_from -= self._start
+            self._start = 0
+
+
+class LengthPrefixedFrameDecoder:
+    """
+    Reads frames made of a FRAME_HEADER followed by exactly `length` payload bytes.
+
+    The payload buffer is allocated at its final size as soon as the header is
+    read and filled in place from the incoming chunks, so there is no delimiter
+    scanning and each payload byte is copied exactly once.
+    """
+
+    def __init__(self, max_length: int = 500 * 1024 * 1024):
+        self.max_length = max_length
+        self._header = bytearray()
+        self._frame_type = None
+        self._payload = None
+        self._filled = 0
+        self._frames = deque()
+
+    def feed(self, data: bytes):
+        """Parses a received chunk, completing as many frames as it contains."""
+        view = memoryview(data)
+        pos = 0
+        while pos < len(view):
+            if self._payload is None:
+                needed = FRAME_HEADER.size - len(self._header)
+                self._header += view[pos:pos + needed]
+                pos += needed
+                if len(self._header) < FRAME_HEADER.size:
+                    break
+                self._frame_type, length = FRAME_HEADER.unpack(self._header)
+                self._header.clear()
+                if length > self.max_length:
+                    raise ValueError(f"Frame exceeds maximum length of {self.max_length} bytes")
+                self._payload = bytearray(length)
+                self._filled = 0
+            else:
+                count = min(len(view) - pos, len(self._payload) - self._filled)
+                self._payload[self._filled:self._filled + count] = view[pos:pos + count]
+                self._filled += count
+                pos += count
+
+            if self._payload is not None and self._filled == len(self._payload):
+                self._frames.append(Frame(self._frame_type, self._payload))
+                self._payload = None
+
+    def next_frame(self):
+        """Returns the next complete Frame, or None if more data is needed."""
+        if self._frames:
+            return self._frames.popleft()
+        return None
+
+    def buffered(self) -> int:
+        """Number of bytes waiting for the rest of their frame."""
+        return len(self._header) + self._filled
@@ -0,0 +1,133 @@
+import time
+import asyncio
+from collections import Counter, OrderedDict, deque
+
+
+# Message classes, each consumed by its own lane in SimpleTCPClient
+CONTROL = "control"  # acknowledge, command_response, camera_connection, unknown types
+PLATES = "plates"  # plates_data: never dropped
+LIVE = "live"  # live: only the latest frame per camera is kept
+TELEMETRY = "telemetry"  # heartbeat, resources: sampled
+
+MESSAGE_CLASSES = {
+    "plates_data": PLATES,
+    "live": LIVE,
+    "heartbeat": TELEMETRY,
+    "resources": TELEMETRY,
+}
+
+
+def message_class(message_type):
+    return MESSAGE_CLASSES.get(message_type, CONTROL)
+
+
+class IngestQueue:
+    """
+    Bounded queue between SimpleTCPClient.dataReceived and the message handlers
+    of one LPR connection, with one lane per message class so that each class
+    can be consumed independently.
+
+    - control and plates_data messages are never dropped. When more than
+      `max_pending` of them are waiting, `on_full` is called so the caller can
+      pause reading from the socket, and `on_drain` once half of them are served.
+    - live frames are coalesced per camera: a newer frame replaces the one
+      still waiting, so a burst of live frames costs one frame per camera.
+    - heartbeat/resources are sampled: at most one per message type is accepted
+      every `sample_interval` seconds.
+    """
+
+    def __init__(self, max_pending: int = 1000, sample_interval: float = 1.0, on_full=None, on_drain=None):
+        self.max_pending = max_pending
+        self.sample_interval = sample_interval
+        self.on_full = on_full
+        self.on_drain = on_drain
+        self.paused = False
+        self.received = Counter()  # Messages offered, by messageType
+        self.dropped = Counter()  # Messages dropped or replaced, by messageType
+
+        self._control = deque()
+        self._plates = deque()
+        self._live = OrderedDict()  # camera_id -> (message_type, camera_id, item)
+        self._telemetry = OrderedDict()  # message_type -> (message_type, camera_id, item)
+        self._last_sampled = {}
+        self._ready = {kind: asyncio.Event() for kind in (CONTROL, PLATES, LIVE, TELEMETRY)}
+
+    def put(self, message_type, camera_id, item):
+        """Offers a message to the queue without blocking. Returns False if it was dropped."""
+        self.received[message_type] += 1
+        kind = message_class(message_type)
+
+        if kind == LIVE:
+            if camera_id in self._live:
+                self.dropped[message_type] += 1
+            self._live[camera_id] = (message_type, camera_id, item)
+        elif kind == TELEMETRY:
+            now = time.monotonic()
+            if now - self._last_sampled.get(message_type, float("-inf")) < self.sample_interval:
+                self.dropped[message_type] += 1
+                return False
+            self._last_sampled[message_type] = now
+            if message_type in self._telemetry:
+                self.dropped[message_type] += 1
+            self._telemetry[message_type] = (message_type, camera_id, item)
+        else:
+            queue = self._plates if kind == PLATES else self._control
+            queue.append((message_type, camera_id, item))
+            if not self.paused and len(self._control) + len(self._plates) >= self.max_pending:
+                self.paused = True
+                if self.on_full:
+                    self.on_full()
+
+        self._ready[kind].set()
+        return True
+
+    async def get(self, kind):
+        """Waits for and returns the next (message_type, camera_id, item) of a message class."""
+        while True:
+            message = self.get_nowait(kind)
+            if message is not None:
+                return message
+            self._ready[kind].clear()
+            await self._ready[kind].wait()
+
+    def get_nowait(self, kind):
+        """Returns the next (message_type, camera_id, item) of a message class, or None if empty."""
+        if kind == CONTROL and self._control:
+            message = self._control.popleft()
+        elif kind == PLATES and self._plates:
+            message = self._plates.popleft()
+        elif kind == LIVE and self._live:
+            _, message = self._live.popitem(last=False)
+        elif kind == TELEMETRY and self._telemetry:
+            _, message = self._telemetry.popitem(last=False)
+        else:
+            return None
+
+        if self.paused and len(self._control) + len(self._plates) <= self.max_pending // 2:
+            self.paused = False
+            if self.on_drain:
+                self.on_drain()
+        return message
+
+    def depth(self):
+        """Number of waiting messages per message class."""
+        return {
+            CONTROL: len(self._control),
+            PLATES: len(self._plates),
+            LIVE: len(self._live),
+            TELEMETRY: len(self._telemetry),
+        }
+
+    def stats(self):
+        return {
+            "depth": self.depth(),
+            "received": dict(self.received),
+            "dropped": dict(self.dropped),
+            "paused": self.paused,
+        }
+
+    def clear(self):
+        self._control.clear()
+        self._plates.clear()
+        self._live.clear()
+        self._telemetry.clear()
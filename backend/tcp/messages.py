@@ -0,0 +1,182 @@
+import re
+from typing import Any, Optional, Union
+
+import msgspec
+
+
+class BlobRef(msgspec.Struct):
+    """Reference to a binary blob carried after the JSON header of a frame."""
+    blob: int
+
+
+# Images arrive as base64 strings in JSON frames or as BlobRefs in binary frames.
+# resolve_blobs() replaces every BlobRef with the blob bytes right after decoding.
+Image = Union[str, BlobRef, None]
+
+
+class Message(msgspec.Struct, tag_field="messageType", rename="camel", kw_only=True):
+    """Envelope shared by every message sent by the LPR module."""
+    message_id: Optional[str] = None
+
+
+class AcknowledgeBody(msgspec.Struct, rename="camel"):
+    reply_to: Optional[str] = None
+    protocol_version: int = 1
+
+
+class Acknowledge(Message, tag="acknowledge"):
+    message_body: AcknowledgeBody = msgspec.field(default_factory=AcknowledgeBody)
+
+
+class Plate(msgspec.Struct):
+    plate: str = "Unknown"
+    plate_image: Image = None
+
+
+class Car(msgspec.Struct):
+    plate: Plate = msgspec.field(default_factory=Plate)
+    ocr_accuracy: float = 0.0
+    vision_speed: float = 0.0
+    vehicle_class: dict = msgspec.field(default_factory=dict)
+    vehicle_type: dict = msgspec.field(default_factory=dict)
+    vehicle_color: dict = msgspec.field(default_factory=dict)
+
+
+class PlatesDataBody(msgspec.Struct):
+    camera_id: int
+    timestamp: str
+    full_image: Image = None
+    cars: list[Car] = msgspec.field(default_factory=list)
+
+
+class PlatesData(Message, tag="plates_data"):
+    message_body: PlatesDataBody
+
+
+class LiveBody(msgspec.Struct):
+    camera_id: int
+    live_image: Image = None
+
+
+class Live(Message, tag="live"):
+    message_body: LiveBody
+
+
+class Heartbeat(Message, tag="heartbeat"):
+    message_body: dict = msgspec.field(default_factory=dict)
+
+
+class Resources(Message, tag="resources"):
+    # Forwarded as sent (CPU_USAGE, RAM_USAGE, GPU_USAGE, ...), so left untyped
+    message_body: dict = msgspec.field(default_factory=dict)
+
+
+class CameraConnectionBody(msgspec.Struct):
+    connection: Any = msgspec.field(default=None, name="Connection")
+
+
+class CameraConnection(Message, tag="camera_connection"):
+    message_body: CameraConnectionBody = msgspec.field(default_factory=CameraConnectionBody)
+
+
+class CommandResponse(Message, tag="command_response"):
+    message_body: dict = msgspec.field(default_factory=dict)
+
+
+class UnknownMessage(msgspec.Struct):
+    """Fallback used to report frames whose messageType is not handled."""
+    message_type: Optional[str] = msgspec.field(default=None, name="messageType")
+
+
+LprMessage = Union[Acknowledge, PlatesData, Live, Heartbeat, Resources, CameraConnection, CommandResponse]
+_MESSAGE_TYPES = {message_type.__struct_config__.tag for message_type in LprMessage.__args__}
+
+# strict=False lets numeric fields sent as strings (e.g. "camera_id": "3") through
+_decoder = msgspec.json.Decoder(LprMessage, strict=False)
+_fallback_decoder = msgspec.json.Decoder(UnknownMessage)
+
+
+_MESSAGE_TYPE_PATTERN = re.compile(rb'"messageType"\s*:\s*"([^"]*)"')
+_CAMERA_ID_PATTERN = re.compile(rb'"camera_id"\s*:\s*"?(\d+)')
+
+
+def peek_header(header):
+    """
+    Reads messageType and camera_id from a raw frame header without decoding it.
+    Used to route frames before paying for a full decode; either value is None
+    when it is not present.
+    """
+    match = _MESSAGE_TYPE_PATTERN.search(header)
+    message_type = match.group(1).decode() if match else None
+    camera_id = None
+    if message_type in ("plates_data", "live"):
+        match = _CAMERA_ID_PATTERN.search(header)
+        camera_id = int(match.group(1)) if match else None
+    return message_type, camera_id
+
+
+_LIVE_IMAGE_PATTERN = re.compile(rb'"live_image"\s*:\s*(?:"|\{\s*"blob"\s*:\s*(\d+)\s*\})')
+
+
+def extract_live_image(header, blobs=()):
+    """
+    Returns the live_image of a live frame without decoding the rest of it:
+    the referenced blob as bytes for binary frames, or the base64 text for JSON
+    frames. Raises ValueError when the image cannot be sliced out as-is (e.g.
+    escaped characters), in which case the frame should be fully decoded.
+    """
+    match = _LIVE_IMAGE_PATTERN.search(header)
+    if match is None:
+        raise ValueError("live_image not found in frame")
+    if match.group(1) is not None:
+        return bytes(blobs[int(match.group(1))])
+
+    if isinstance(header, memoryview):
+        header = bytes(header)
+    start = match.end()
+    end = header.find(b'"', start)
+    if end == -1:
+        raise ValueError("Unterminated live_image in frame")
+    if header.find(b"\\", start, end) != -1:
+        raise ValueError("Escaped characters in live_image")
+    return str(memoryview(header)[start:end], "ascii")
+
+
+def decode_message(header, blobs=()):
+    """
+    Decodes and validates a JSON frame header into its typed message struct.
+
+    Returns an UnknownMessage for frames with an unhandled messageType and raises
+    msgspec.DecodeError for malformed frames.
+    """
+    try:
+        message = _decoder.decode(header)
+    except msgspec.ValidationError:
+        message = _fallback_decoder.decode(header)
+        if message.message_type in _MESSAGE_TYPES:
+            # A known type with an invalid body is an error, not an unknown message
+            raise
+        return message
+    resolve_blobs(message, blobs)
+    return message
+
+
+def resolve_blobs(message, blobs):
+    """
+    Replaces BlobRef image fields of a decoded message with the referenced
+    bytes. Raises msgspec.ValidationError for a reference to a blob the frame
+    doesn't carry, so it never reaches the handlers.
+    """
+    def resolve(image):
+        if not isinstance(image, BlobRef):
+            return image
+        if not 0 <= image.blob < len(blobs):
+            raise msgspec.ValidationError(f"Reference to missing blob {image.blob} ({len(blobs)} in frame)")
+        return bytes(blobs[image.blob])
+
+    if isinstance(message, PlatesData):
+        message.message_body.full_image = resolve(message.message_body.full_image)
+        for car in message.message_body.cars:
+            car.plate.plate_image = resolve(car.plate.plate_image)
+    elif isinstance(message, Live):
+        message.message_body.live_image = resolve(message.message_body.live_image)
@@ -0,0 +1,160 @@
+import time
+import asyncio
+import logging
+
+from settings import settings
+from schema.traffic import TrafficCreate
+from socket_management import emit_to_requested_sids
+from tcp.traffic_writer import traffic_writer
+from utils.metrics import PLATE_READS_MERGED, PLATE_BURSTS
+
+logger = logging.getLogger(__name__)
+
+
+class PlateBurst:
+    """Consecutive reads of one plate on one camera, merged into a single event."""
+
+    __slots__ = (
+        "camera_id", "traffic", "plate_image", "car", "full_image", "first_timestamp",
+        "first_seen", "last_seen", "hit_count", "opened", "touched", "received", "metrics",
+    )
+
+    def __init__(self, traffic: TrafficCreate, plate_image, car: dict, full_image, first_timestamp: str, metrics=None):
+        now = time.monotonic()
+        self.camera_id = traffic.camera_id
+        self.traffic = traffic
+        self.plate_image = plate_image
+        self.car = car
+        self.full_image = full_image
+        self.first_timestamp = first_timestamp
+        self.first_seen = traffic.timestamp
+        self.last_seen = traffic.timestamp
+        self.hit_count = 1
+        self.opened = now
+        self.touched = now
+        self.received = time.perf_counter()
+        self.metrics = metrics
+
+    def merge(self, traffic: TrafficCreate, plate_image, car: dict, full_image):
+        self.hit_count += 1
+        self.touched = time.monotonic()
+        self.last_seen = max(self.last_seen, traffic.timestamp)
+        if traffic.ocr_accuracy > self.traffic.ocr_accuracy:
+            # Keep the best read, under the event_id of the first one
+            self.traffic = traffic.model_copy(update={"event_id": self.traffic.event_id})
+            self.plate_image = plate_image
+            self.car = car
+            self.full_image = full_image
+
+
+class PlateDeduplicator:
+    """
+    Merges the reads of a vehicle seen on consecutive frames into one event.
+
+    Reads are keyed by camera and plate number as read; plates that only
+    look alike (see utils.plates) may be different vehicles, so they are
+    never merged. A burst closes once
+    no read joined it for `window` seconds, or `max_duration` seconds after
+    it opened so a parked vehicle still produces events. On close, the read
+    with the best ocr_accuracy is stored, with the hit count and the first
+    and last timestamps, and broadcast once to the Socket.IO subscribers.
+
+    Storing and broadcasting happen `window` seconds after the last read.
+    Open bursts are only in memory: stop() hands them to the traffic writer,
+    which stores or spools them when it stops, but a crash loses them.
+    Disabled with a window of 0.
+    """
+
+    def __init__(self, window: float = 0.0, max_duration: float = 30.0):
+        self.window = window
+        self.max_duration = max_duration
+        self._bursts = {}
+        self._task = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """
+        Stops the sweeper and hands every open burst to the traffic writer,
+        without broadcasting it. Called before traffic_writer.stop(), which
+        then stores or spools them.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._close(list(self._bursts), broadcast=False)
+
+    def offer(self, traffic: TrafficCreate, plate_image, car: dict, full_image, first_timestamp: str, metrics=None):
+        """Adds a read to the open burst of its plate, or opens one."""
+        self.start()
+        key = (traffic.camera_id, traffic.plate_number)
+        burst = self._bursts.get(key)
+        if burst is None:
+            self._bursts[key] = PlateBurst(traffic, plate_image, car, full_image, first_timestamp, metrics)
+        else:
+            burst.merge(traffic, plate_image, car, full_image)
+            PLATE_READS_MERGED.inc()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(min(self.window / 2, 0.25))
+            now = time.monotonic()
+            expired = [
+                key for key, burst in self._bursts.items()
+                if now - burst.touched >= self.window or now - burst.opened >= self.max_duration
+            ]
+            if expired:
+                await self._close(expired)
+
+    async def _close(self, keys, broadcast: bool = True):
+        for key in keys:
+            burst = self._bursts.pop(key)
+            PLATE_BURSTS.inc()
+            try:
+                await self._emit(burst, broadcast)
+            except Exception as e:
+                logger.error(f"Failed to store plate {burst.traffic.plate_number}: {e}")
+
+    @staticmethod
+    async def _emit(burst: PlateBurst, broadcast: bool = True):
+        traffic = burst.traffic.model_copy(update={
+            "timestamp": burst.first_seen,
+            "last_seen": burst.last_seen,
+            "hit_count": burst.hit_count,
+        })
+        future = await traffic_writer.submit(traffic, plate_image=burst.plate_image)
+        if burst.metrics is not None:
+            stored = asyncio.gather(future, return_exceptions=True)
+            stored.add_done_callback(lambda _: burst.metrics.db_write_latency.observe(time.perf_counter() - burst.received))
+        if not broadcast:
+            return
+
+        socketio_message = {
+            "messageType": "plates_data",
+            "timestamp": burst.first_timestamp,
+            "camera_id": burst.camera_id,
+            "full_image": burst.full_image,
+            "cars": [{
+                **burst.car,
+                "hit_count": burst.hit_count,
+                "first_seen": burst.first_seen.isoformat(),
+                "last_seen": burst.last_seen.isoformat(),
+            }],
+        }
+        asyncio.ensure_future(emit_to_requested_sids("plates_data", socketio_message, burst.camera_id))
+
+
+plate_deduplicator = PlateDeduplicator(
+    window=settings.PLATE_DEDUP_WINDOW_SECONDS,
+    max_duration=settings.PLATE_DEDUP_MAX_SECONDS,
+)
@@ -1,7 +1,10 @@
 import sys
 import asyncio
+import logging
 from twisted.internet import asyncioreactor
 
+logger = logging.getLogger(__name__)
+
 if "twisted.internet.reactor" in sys.modules:
     del sys.modules["twisted.internet.reactor"]
 if sys.platform == "win32":
@@ -9,12 +12,12 @@ if sys.platform == "win32":
 
 try:
     asyncioreactor.install(asyncio.get_event_loop())
-    print("[INFO] Twisted reactor installed successfully.")
+    logger.info("Twisted reactor installed successfully.")
 except RuntimeError:
-    print("[WARN] Reactor already installed.")
+    logger.warning("Reactor already installed.")
 
 import threading
-print(f"[DEBUG] Reactor is running in thread: {threading.current_thread().name}")
+logger.debug(f"Reactor is running in thread: {threading.current_thread().name}")
 
 
 # Ensure the reactor is installed only once
@@ -0,0 +1,121 @@
+import os
+import zlib
+import struct
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import msgspec
+
+logger = logging.getLogger(__name__)
+
+
+# Record layout: payload length and CRC32 of the payload, then the payload
+RECORD_HEADER = struct.Struct(">II")
+SEGMENT_SUFFIX = ".seg"
+
+
+class SpooledTraffic(msgspec.Struct):
+    """A traffic row ready to be inserted, as kept in the spool."""
+    event_id: Optional[str]
+    plate_number: str
+    ocr_accuracy: float
+    vision_speed: float
+    timestamp: datetime
+    camera_id: int
+    gate_id: Optional[int]  # None when the camera wasn't resolved before spooling
+    plate_image_path: Optional[str]
+    plate_normalized: Optional[str] = None
+    last_seen: Optional[datetime] = None
+    hit_count: int = 1
+
+
+_encoder = msgspec.json.Encoder()
+_decoder = msgspec.json.Decoder(list[SpooledTraffic])
+
+
+class Spool:
+    """
+    Append-only write-ahead spool of traffic rows on local disk, used while
+    the database is slow or down.
+
+    Rows are appended in records of one batch each, framed by their length
+    and CRC32, to numbered segment files. A segment is closed once it reaches
+    `segment_bytes` or when the replayer takes it, so a segment is never
+    read while it is being written. Every append is fsynced before it
+    returns. A record cut short by a crash, or whose checksum doesn't match,
+    ends the readable part of its segment.
+
+    The methods do blocking file IO; callers on the event loop run them in
+    an executor.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 16 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self._lock = threading.Lock()
+        self._file = None
+        self._sequence = max((self._segment_sequence(path) for path in self._segment_paths()), default=0)
+
+    @staticmethod
+    def _segment_sequence(path: Path) -> int:
+        return int(path.stem)
+
+    def _segment_paths(self):
+        return sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}"), key=self._segment_sequence)
+
+    def append(self, rows):
+        """Durably appends a batch of row dicts (the columns of SpooledTraffic)."""
+        payload = _encoder.encode(rows)
+        record = RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            if self._file is None:
+                self._sequence += 1
+                self._file = open(self.directory / f"{self._sequence:012d}{SEGMENT_SUFFIX}", "ab")
+            self._file.write(record)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            if self._file.tell() >= self.segment_bytes:
+                self._close_segment()
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def closed_segments(self):
+        """Closes the segment being written and returns every segment, oldest first."""
+        with self._lock:
+            self._close_segment()
+            return self._segment_paths()
+
+    def has_rows(self) -> bool:
+        with self._lock:
+            return self._file is not None or bool(self._segment_paths())
+
+    @staticmethod
+    def read_segment(path: Path):
+        """Returns the rows of a segment as dicts, up to the first damaged record."""
+        rows = []
+        data = path.read_bytes()
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            length, checksum = RECORD_HEADER.unpack_from(data, offset)
+            payload = data[offset + RECORD_HEADER.size:offset + RECORD_HEADER.size + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                logger.error(f"Damaged record in spool segment {path.name} at offset {offset}; skipping the rest")
+                break
+            rows.extend(msgspec.structs.asdict(row) for row in _decoder.decode(payload))
+            offset += RECORD_HEADER.size + length
+        return rows
+
+    @staticmethod
+    def remove(path: Path):
+        path.unlink(missing_ok=True)
+
+    def close(self):
+        with self._lock:
+            self._close_segment()
@@ -1,20 +1,52 @@
-import os
+import logging
 import json
+import time
 import uuid
 import hmac
 import hashlib
 import asyncio
+import msgspec
+from collections import defaultdict
 from pathlib import Path
 from twisted.internet import protocol
-from twisted.protocols import basic
-from sqlalchemy.exc import SQLAlchemyError
 
 
 from settings import settings
 from database.engine import async_session
 from socket_management import emit_to_requested_sids
-from crud.traffic import TrafficOperation
 from schema.traffic import TrafficCreate
+from tcp.framing import (
+    DelimitedFrameDecoder,
+    LengthPrefixedFrameDecoder,
+    encode_frame,
+    split_blobs,
+    FRAME_TYPE_JSON,
+    FRAME_TYPE_JSON_WITH_BLOBS,
+    PROTOCOL_DELIMITED,
+    PROTOCOL_LENGTH_PREFIXED,
+    SUPPORTED_PROTOCOLS,
+)
+from tcp.ingest_queue import IngestQueue, CONTROL, PLATES, LIVE, TELEMETRY
+from tcp.decode_pool import decode_frame
+from tcp.traffic_writer import traffic_writer, event_id
+from tcp.plate_dedup import plate_deduplicator
+from utils.metrics import LprMetrics
+from utils.logging_config import preview
+from tcp.messages import (
+    peek_header,
+    extract_live_image,
+    decode_message,
+    Acknowledge,
+    CommandResponse,
+    PlatesData,
+    Live,
+    Heartbeat,
+    Resources,
+    CameraConnection,
+    UnknownMessage,
+)
+
+logger = logging.getLogger(__name__)
 
 
 async def fetch_lpr_settings(lpr_id: int):
@@ -68,48 +100,77 @@ async def fetch_lpr_settings(lpr_id: int):
         return {"lpr_id": lpr.id, "settings": settings_data, "cameras_data": cameras_data}
 
 
-class SimpleTCPClient(basic.LineReceiver):
-    delimiter = b'SSENDSS'  # Use <END> as the delimiter
-    maxLength = 500 * 1024 * 1024
+class SimpleTCPClient(protocol.Protocol):
+    maxLength = 500 * 1024 * 1024  # Largest frame accepted from the LPR
     def __init__(self):
         self.auth_message_id = None
-        self.incomplete_data = ""
+        # Frames are <END>-delimited until a newer protocol is negotiated in authenticate()
+        self.protocol_version = PROTOCOL_DELIMITED
+        self.awaiting_negotiation = False
+        self.decoder = DelimitedFrameDecoder(b"<END>", self.maxLength)
         self.authenticated = False  # Track authentication status locally
-        self.message_queue = asyncio.Queue()
+        self.message_queue = IngestQueue(
+            max_pending=settings.LPR_QUEUE_MAX_PENDING,
+            sample_interval=settings.LPR_TELEMETRY_SAMPLE_SECONDS,
+            on_full=self._pause_reading,
+            on_drain=self._resume_reading,
+        )
+        self.queue_task = None
         self.lock = asyncio.Lock()
-
-        self.buffer = b""
-        self.expected_length = None
+        # Number of concurrent consumers per message class
+        self.lanes = {
+            CONTROL: 1,
+            PLATES: settings.LPR_PLATES_CONCURRENCY,
+            LIVE: settings.LPR_LIVE_CONCURRENCY,
+            TELEMETRY: 1,
+        }
+        # Plate events of one camera are stored in arrival order
+        self.camera_locks = defaultdict(asyncio.Lock)
+        self.handlers = {
+            Acknowledge: self._handle_acknowledgment,
+            CommandResponse: self._handle_command_response,
+            PlatesData: self._handle_plates_data,
+            Live: self._handle_live_data,
+            Heartbeat: self._handle_heartbeat,
+            Resources: self._handle_resources,
+            CameraConnection: self._handle_camera_connection,
+        }
 
     def connectionMade(self):
         """Called when a connection to the server is made."""
-        print(f"[INFO] Connected to {self.transport.getPeer()}")
+        logger.info(f"Connected to {self.transport.getPeer()}")
+        self.metrics = LprMetrics(self.factory.lpr_id)
         self.authenticate()
         # Start processing the message queue
-        asyncio.create_task(self.process_message_queue())
+        self.queue_task = asyncio.create_task(self.process_message_queue())
 
     def authenticate(self):
         """Sends an authentication message with a secure token."""
         self.auth_message_id = str(uuid.uuid4())
         auth_message = self._create_auth_message(self.auth_message_id, self.factory.auth_token)
         self._send_message(auth_message)
-        print(f"[INFO] Authentication message sent with ID: {self.auth_message_id}")
+        self.awaiting_negotiation = True
+        logger.info(f"Authentication message sent with ID: {self.auth_message_id}")
 
     def _create_auth_message(self, message_id, token):
         """Creates a JSON authentication message."""
         return json.dumps({
             "messageId": message_id,
             "messageType": "authentication",
-            "messageBody": {"token": token}
+            "messageBody": {"token": token, "protocolVersions": list(SUPPORTED_PROTOCOLS)}
         })
 
     def _send_message(self, message):
         """Sends a message to the server."""
         if self.transport and self.transport.connected:
-            print(f"[INFO] Sending message: {message}")
-            self.transport.write((message + '\n').encode('utf-8'))
+            logger.info(f"Sending message ({len(message)} chars)")
+            logger.debug(f"Sending message: {preview(message)}")
+            if self.protocol_version == PROTOCOL_LENGTH_PREFIXED:
+                self.transport.write(encode_frame(message.encode('utf-8')))
+            else:
+                self.transport.write((message + '\n').encode('utf-8'))
         else:
-            print("[ERROR] Transport is not connected. Message not sent.")
+            logger.error("Transport is not connected. Message not sent.")
 
     def is_valid_utf8(self, data):
         try:
@@ -120,64 +181,124 @@ class SimpleTCPClient(basic.LineReceiver):
 
     def dataReceived(self, data):
         """Accumulates and processes data received from the server."""
+        self.metrics.bytes_received.inc(len(data))
         try:
-            # Append the new data to the buffer
-            self.incomplete_data += data.decode('utf-8')
+            self.decoder.feed(data)
 
             # Process all complete messages in the buffer
-            while '<END>' in self.incomplete_data:
-                full_message, self.incomplete_data = self.incomplete_data.split('<END>', 1)
-                full_message = full_message.strip()  # Remove extra spaces or newlines (if any)
-
-                if full_message:
-                    # Enqueue the complete message for asynchronous processing
-                    asyncio.create_task(self.message_queue.put(full_message))
-        except UnicodeDecodeError as e:
-            print(f"[ERROR] Failed to decode data: {e}")
+            while (frame := self.decoder.next_frame()) is not None:
+                try:
+                    if frame.frame_type == FRAME_TYPE_JSON_WITH_BLOBS:
+                        header, blobs = split_blobs(frame.payload)
+                    elif frame.frame_type == FRAME_TYPE_JSON:
+                        header, blobs = frame.payload, []
+                    else:
+                        logger.warning(f"Received unknown frame type: {frame.frame_type}")
+                        continue
+                except ValueError as e:
+                    logger.error(f"Failed to decode data: {e}")
+                    continue
+                if self.awaiting_negotiation:
+                    # Must happen before the next frame is read, which may already use the new framing
+                    self._negotiate_protocol(header)
+                # Enqueue the complete message for asynchronous processing
+                message_type, camera_id = peek_header(header)
+                self.metrics.frame_received(message_type)
+                self.message_queue.put(message_type, camera_id, (header, blobs))
+        except ValueError as e:
+            logger.error(f"{e}. Dropping connection.")
+            self.transport.loseConnection()
+
+    def _negotiate_protocol(self, header):
+        """
+        Switches the connection framing when the LPR acknowledges authentication
+        with a protocol version newer than <END> delimiting.
+        """
+        try:
+            message = decode_message(header)
+        except msgspec.DecodeError:
+            return
+        if not isinstance(message, Acknowledge) or message.message_body.reply_to != self.auth_message_id:
+            return
 
+        self.awaiting_negotiation = False
+        version = message.message_body.protocol_version
+        if version == PROTOCOL_LENGTH_PREFIXED:
+            # Bytes already buffered after the acknowledgment belong to the new framing
+            remaining = self.decoder.take_remaining()
+            self.decoder = LengthPrefixedFrameDecoder(self.maxLength)
+            self.protocol_version = version
+            self.decoder.feed(remaining)
+        logger.info(f"Using LPR protocol version {self.protocol_version}")
+
+    def _pause_reading(self):
+        """Stops reading from the LPR while too many plate/control messages are waiting."""
+        logger.warning(f"Ingest queue full for LPR {self.factory.lpr_id}. Pausing reads.")
+        self.transport.pauseProducing()
+
+    def _resume_reading(self):
+        logger.info(f"Ingest queue drained for LPR {self.factory.lpr_id}. Resuming reads.")
+        self.transport.resumeProducing()
 
     async def process_message_queue(self):
-        """Asynchronously processes messages from the queue."""
+        """
+        Asynchronously processes messages from the queue, with independent
+        consumer lanes per message class so slow database writes for plates
+        never hold up live frames or heartbeats, and the other way around.
+        """
+        lanes = [
+            self._process_lane(kind)
+            for kind, concurrency in self.lanes.items()
+            for _ in range(concurrency)
+        ]
         try:
-            while True:
-                try:
-                    message = await self.message_queue.get()
-                    await self._process_message(message)
-                except Exception as e:
-                    print(f"[ERROR] Exception in processing message: {e}")
-                finally:
-                    if not self.message_queue.empty():
-                        self.message_queue.task_done()
+            await asyncio.gather(*lanes)
         except asyncio.CancelledError:
-            print("[INFO] Message processing task cancelled. Cleaning up...")
+            logger.info("Message processing task cancelled. Cleaning up...")
 
             # Ensure no unprocessed items are left in the queue
-            while not self.message_queue.empty():
-                self.message_queue.get_nowait()
-                self.message_queue.task_done()
+            self.message_queue.clear()
+
+    async def _process_lane(self, kind):
+        """Consumes messages of one message class."""
+        while True:
+            try:
+                message_type, camera_id, (message, blobs) = await self.message_queue.get(kind)
+                if kind == PLATES:
+                    # Acquired before yielding to the loop, so same-camera events keep their order
+                    async with self.camera_locks[camera_id]:
+                        await self._process_message(message, blobs, message_type)
+                elif kind == LIVE:
+                    await self._relay_live_data(camera_id, message, blobs)
+                else:
+                    await self._process_message(message, blobs, message_type)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Exception in processing message: {e}")
 
-    async def _process_message(self, message):
-        """Processes each received message."""
+    async def _process_message(self, header, blobs=(), message_type=None):
+        """Decodes each received message once and dispatches it to its typed handler."""
+        start = time.perf_counter()
         try:
-            parsed_message = json.loads(message)
-            message_type = parsed_message.get("messageType")
-            handler = {
-                "acknowledge": self._handle_acknowledgment,
-                "command_response": self._handle_command_response,
-                "plates_data": self._handle_plates_data,
-                "live": self._handle_live_data,
-                "heartbeat": self._handle_heartbeat,
-                "resources": self._handle_resources,
-                "camera_connection": self._handle_camera_connection
-            }.get(message_type, self._handle_unknown_message)
-            await handler(parsed_message)
-        except json.JSONDecodeError as e:
-            print(f"[ERROR] Failed to parse message: {e}")
-
-    async def _handle_acknowledgment(self, message):
-        reply_to = message["messageBody"].get("replyTo")
+            message, plate_images = await decode_frame(header, blobs)
+        except msgspec.DecodeError as e:
+            logger.error(f"Failed to parse message: {e}")
+            return
+        self.metrics.parse_latency.observe(time.perf_counter() - start)
+
+        handler = self.handlers.get(type(message), self._handle_unknown_message)
+        with self.metrics.handler_latency(message_type).time():
+            if plate_images is not None:
+                # Plate images were already decoded in the process pool
+                await handler(message, plate_images=plate_images)
+            else:
+                await handler(message)
+
+    async def _handle_acknowledgment(self, message: Acknowledge):
+        reply_to = message.message_body.reply_to
         if reply_to == self.auth_message_id:
-            print("[INFO] Authentication successful.")
+            logger.info("Authentication successful.")
             self.authenticated = True
             self.factory.authenticated = True
 
@@ -198,107 +319,166 @@ class SimpleTCPClient(basic.LineReceiver):
                         }
                 }
                 self._send_message(json.dumps(settings_message))
-                print("[INFO] LPR settings sent to the server.")
+                logger.info("LPR settings sent to the server.")
             except Exception as e:
-                print(f"[ERROR] Failed to send LPR settings: {e}")
+                logger.error(f"Failed to send LPR settings: {e}")
 
         else:
-            print(f"[INFO] Received acknowledgment for message ID: {reply_to}")
+            logger.info(f"Received acknowledgment for message ID: {reply_to}")
 
     async def _broadcast_to_socketio(self, event_name, data, camera_id=None):
         """Efficiently broadcast a message to all subscribed clients for an event."""
         await emit_to_requested_sids(event_name, data, camera_id)
 
-    async def _handle_plates_data(self, message):
+    async def _handle_plates_data(self, message: PlatesData, plate_images=None):
         # print("Plate data recived")
-        message_body = message["messageBody"]
-        camera_id = message_body.get("camera_id")
-        timestamp = message_body.get("timestamp")
-
+        message_body = message.message_body
+        camera_id = message_body.camera_id
+        timestamp = message_body.timestamp
 
-        try:
-            async with async_session() as session:
-                traffic_operation = TrafficOperation(session)
 
-                try:
-                    for car in message_body.get("cars", []):
-                        plate_number = car.get("plate", {}).get("plate", "Unknown")
-                        ocr_accuracy = car.get("ocr_accuracy", "Unknown")
-                        vision_speed = car.get("vision_speed", 0.0)
-                        plate_image_base64 = car.get("plate", {}).get("plate_image", "")
-                        # Create a TrafficCreate object for the car
-                        traffic_data = TrafficCreate(
-                            plate_number=plate_number,
-                            ocr_accuracy=ocr_accuracy,
-                            vision_speed=vision_speed,
-                            plate_image_path=plate_image_base64,
-                            timestamp=timestamp,
-                            camera_id=camera_id,
-                        )
-
-                        # Use the TrafficOperation to store the traffic data
-                        traffic_entry = await traffic_operation.create_traffic(traffic_data)
-                        print(f"[INFO] Stored traffic data: {traffic_entry.id} for plate {plate_number}")
-
-                except SQLAlchemyError as e:
-                    print(f"[ERROR] Database error while storing traffic data: {e}")
-                    await session.rollback()
-                finally:
-                    await session.close()
+        if plate_deduplicator.enabled:
+            self._offer_plates(message_body, plate_images)
+            return
 
+        start = time.perf_counter()
+        futures = []
+        try:
+            for index, car in enumerate(message_body.cars):
+                plate_image = car.plate.plate_image
+                # Binary frames carry the JPEG itself, older frames a base64 string
+                if plate_images is not None:
+                    plate_image_bytes = plate_images[index]
+                else:
+                    plate_image_bytes = plate_image if isinstance(plate_image, bytes) else None
+                traffic_data = TrafficCreate(
+                    plate_number=car.plate.plate,
+                    ocr_accuracy=car.ocr_accuracy,
+                    vision_speed=car.vision_speed,
+                    plate_image_path=None if plate_image_bytes is not None else plate_image,
+                    timestamp=timestamp,
+                    camera_id=camera_id,
+                    event_id=event_id(camera_id, timestamp, index, car.plate.plate),
+                )
+                # Stored by the shared writer in its next batch
+                futures.append(await traffic_writer.submit(traffic_data, plate_image=plate_image_bytes))
         except Exception as e:
-            print(f"[ERROR] Unexpected error: {e}")
+            logger.error(f"Unexpected error: {e}")
 
+        if futures:
+            stored = asyncio.gather(*futures, return_exceptions=True)
+            stored.add_done_callback(lambda _: self.metrics.db_write_latency.observe(time.perf_counter() - start))
 
         socketio_message = {
             "messageType": "plates_data",
             "timestamp": timestamp,
             "camera_id": camera_id,
-            "full_image": message_body.get("full_image"),
+            "full_image": message_body.full_image,
             "cars": [
                 {
-                    "plate_number": car.get("plate", {}).get("plate", "Unknown"),
-                    "plate_image": car.get("plate", {}).get("plate_image", ""),
-                    "ocr_accuracy": car.get("ocr_accuracy", "Unknown"),
-                    "vision_speed": car.get("vision_speed", 0.0),
-                    "vehicle_class": car.get("vehicle_class", {}),
-                    "vehicle_type": car.get("vehicle_type", {}),
-                    "vehicle_color": car.get("vehicle_color", {})
+                    "plate_number": car.plate.plate,
+                    "plate_image": car.plate.plate_image or "",
+                    "ocr_accuracy": car.ocr_accuracy,
+                    "vision_speed": car.vision_speed,
+                    "vehicle_class": car.vehicle_class,
+                    "vehicle_type": car.vehicle_type,
+                    "vehicle_color": car.vehicle_color
                 }
-                for car in message_body.get("cars", [])
+                for car in message_body.cars
             ]
         }
         # print(f"sending to socket ... {socketio_message['camera_id']}")
         asyncio.ensure_future(self._broadcast_to_socketio("plates_data", socketio_message, camera_id))
 
+    def _offer_plates(self, message_body, plate_images=None):
+        """
+        Hands every car of the frame to the dedup stage, which stores and
+        broadcasts each vehicle once its burst of reads is over.
+        """
+        camera_id = message_body.camera_id
+        timestamp = message_body.timestamp
+        for index, car in enumerate(message_body.cars):
+            plate_image = car.plate.plate_image
+            if plate_images is not None:
+                plate_image_bytes = plate_images[index]
+            else:
+                plate_image_bytes = plate_image if isinstance(plate_image, bytes) else None
+            try:
+                traffic_data = TrafficCreate(
+                    plate_number=car.plate.plate,
+                    ocr_accuracy=car.ocr_accuracy,
+                    vision_speed=car.vision_speed,
+                    plate_image_path=None if plate_image_bytes is not None else plate_image,
+                    timestamp=timestamp,
+                    camera_id=camera_id,
+                    event_id=event_id(camera_id, timestamp, index, car.plate.plate),
+                )
+            except Exception as e:
+                logger.error(f"Invalid plate {car.plate.plate} from camera {camera_id}: {e}")
+                continue
+            car_data = {
+                "plate_number": car.plate.plate,
+                "plate_image": car.plate.plate_image or "",
+                "ocr_accuracy": car.ocr_accuracy,
+                "vision_speed": car.vision_speed,
+                "vehicle_class": car.vehicle_class,
+                "vehicle_type": car.vehicle_type,
+                "vehicle_color": car.vehicle_color
+            }
+            plate_deduplicator.offer(
+                traffic_data, plate_image_bytes, car_data, message_body.full_image, timestamp, metrics=self.metrics
+            )
+
 
-    async def _handle_command_response(self, message):
+    async def _handle_command_response(self, message: CommandResponse):
         """
         Handles the command response from the server.
         """
         pass
 
-    async def _handle_live_data(self, message):
-        message_body = message["messageBody"]
-        camera_id = message_body.get("camera_id")
+    async def _handle_live_data(self, message: Live):
+        camera_id = message.message_body.camera_id
         live_data = {
             "messageType": "live",
-            "live_image": message_body.get("live_image"),
+            "live_image": message.message_body.live_image,
             "camera_id": camera_id
         }
 
-        print(f"sending live to socket ... {live_data['camera_id']}")
+        logger.debug(f"sending live to socket ... {live_data['camera_id']}")
         asyncio.ensure_future(self._broadcast_to_socketio("live", live_data, camera_id))
 
-    async  def _handle_unknown_message(self, message):
-        print(f"[WARN] Received unknown message type: {message.get('messageType')}")
+    async def _relay_live_data(self, camera_id, header, blobs=()):
+        """
+        Passthrough for live frames: only messageType and camera_id are read from
+        the header and the image is forwarded as-is, without decoding the frame.
+        Falls back to the regular decode path if the image can't be sliced out.
+        """
+        start = time.perf_counter()
+        try:
+            if camera_id is None:
+                raise ValueError("camera_id not found in frame")
+            live_image = extract_live_image(header, blobs)
+        except (ValueError, IndexError):
+            await self._process_message(header, blobs, "live")
+            return
+
+        live_data = {
+            "messageType": "live",
+            "live_image": live_image,
+            "camera_id": camera_id
+        }
+        asyncio.ensure_future(self._broadcast_to_socketio("live", live_data, camera_id))
+        self.metrics.handler_latency("live").observe(time.perf_counter() - start)
+
+    async  def _handle_unknown_message(self, message: UnknownMessage):
+        logger.warning(f"Received unknown message type: {message.message_type}")
 
     def send_command(self, command_data):
         if self.authenticated:
             command_message = self._create_command_message(command_data)
             self._send_message(command_message)
         else:
-            print("[ERROR] Cannot send command: client is not authenticated.")
+            logger.error("Cannot send command: client is not authenticated.")
 
     def _create_command_message(self, command_data):
         """Creates and signs a command message with HMAC for integrity."""
@@ -314,18 +494,16 @@ class SimpleTCPClient(basic.LineReceiver):
             }
         })
 
-    async def _handle_resources(self, message):
-        print(f"[INFO] Resources received: {message['messageBody']}")
-        # cpu_usage = message["messageBody"].get("CPU_USAGE")
-        # ram_usage = message["messageBody"].get("RAM_USAGE")
-        # free_space_percentage = message["messageBody"].get("Free_Space_Percentage")
+    async def _handle_resources(self, message: Resources):
+        logger.info(f"Resources received: {preview(message.message_body)}", extra={"sample_key": ("resources", self.factory.lpr_id)})
         # Process resource data here (e.g., log it or trigger some actions)
-        message["messageBody"]["lpr_id"] = self.factory.lpr_id
-        asyncio.ensure_future(self._broadcast_to_socketio("resources", message['messageBody']))
+        resources = dict(message.message_body)
+        resources["lpr_id"] = self.factory.lpr_id
+        asyncio.ensure_future(self._broadcast_to_socketio("resources", resources))
 
-    async def _handle_camera_connection(self, message):
-        print(f"[INFO] Camera connection status: {message['messageBody']}")
-        is_connected = message["messageBody"].get("Connection")
+    async def _handle_camera_connection(self, message: CameraConnection):
+        logger.info(f"Camera connection status: {preview(message.message_body)}")
+        is_connected = message.message_body.connection
         # Process camera connection status here (e.g., log or update UI)
         try:
             # Broadcast the heartbeat message to all subscribed clients
@@ -333,28 +511,34 @@ class SimpleTCPClient(basic.LineReceiver):
 
             # Optional: Add additional logic for handling heartbeat data, if necessary
         except Exception as e:
-            print(f"[ERROR] Failed to handle camera connection message: {e}")
+            logger.error(f"Failed to handle camera connection message: {e}")
 
 
     def connectionLost(self, reason):
-        print(f"[INFO] Connection lost: {reason}")
+        logger.info(f"Connection lost: {reason}")
+        if self.queue_task:
+            self.queue_task.cancel()
         self.factory.clientConnectionLost(self.transport.connector, reason)
 
-    async def _handle_heartbeat(self, message):
+    async def _handle_heartbeat(self, message: Heartbeat):
         """
         Handles heartbeat messages and sends them to subscribed clients via the socket.
         """
         try:
             # Log the received heartbeat message (optional)
-            print(f"[INFO] Heartbeat received: {message}")
-            message["lpr_id"] = self.factory.lpr_id
+            logger.info(f"Heartbeat received: {preview(message)}", extra={"sample_key": ("heartbeat", self.factory.lpr_id)})
+            # The message as the LPR sent it, without the defaults of fields it left out
+            heartbeat = {"messageType": "heartbeat", "messageBody": message.message_body}
+            if message.message_id is not None:
+                heartbeat["messageId"] = message.message_id
+            heartbeat["lpr_id"] = self.factory.lpr_id
 
             # Broadcast the heartbeat message to all subscribed clients
-            await self._broadcast_to_socketio(event_name="heartbeat", data=message)
+            await self._broadcast_to_socketio(event_name="heartbeat", data=heartbeat)
 
             # Optional: Add additional logic for handling heartbeat data, if necessary
         except Exception as e:
-            print(f"[ERROR] Failed to handle heartbeat message: {e}")
+            logger.error(f"Failed to handle heartbeat message: {e}")
 
 from twisted.internet import reactor, ssl
 
@@ -368,26 +552,31 @@ class ReconnectingTCPClientFactory(protocol.ReconnectingClientFactory):
         self.port = port
         self.reconnecting = False  # Flag to manage reconnections
         self.connection_in_progress = False  # Prevent overlapping connection attempts
+        self.connection_attempts = 0  # Reported as lpr_reconnects in /metrics
+        self.connected_at = None  # time.monotonic() of the current connection
 
     def buildProtocol(self, addr):
         # Always create a new protocol but manage its lifecycle
-        print(f"[INFO] Connected to {addr}")
+        logger.info(f"Connected to {addr}")
         self.resetDelay()  # Reset reconnection delay on successful connection
         self.reconnecting = False  # Clear reconnecting flag
         self.connection_in_progress = False  # Clear connection-in-progress flag
         client = SimpleTCPClient()
         client.factory = self
         self.active_protocol = client  # Set the active protocol instance
+        self.connected_at = time.monotonic()
         return client
 
     def clientConnectionLost(self, connector, reason):
-        print(f"[INFO] Connection lost: {reason}. Scheduling reconnect.")
+        logger.info(f"Connection lost: {reason}. Scheduling reconnect.")
         self.active_protocol = None  # Clear the active protocol on disconnect
+        self.authenticated = False
+        self.connected_at = None
         if not self.connection_in_progress:
             self._attempt_reconnect()  # Only attempt reconnect if not already in progress
 
     def clientConnectionFailed(self, connector, reason):
-        print(f"[ERROR] Connection failed: {reason}. Scheduling reconnect.")
+        logger.error(f"Connection failed: {reason}. Scheduling reconnect.")
         self.active_protocol = None  # Clear the active protocol on failure
         if not self.connection_in_progress:
             self._attempt_reconnect()  # Only attempt reconnect if not already in progress
@@ -395,15 +584,15 @@ class ReconnectingTCPClientFactory(protocol.ReconnectingClientFactory):
     def _attempt_reconnect(self):
         """Reconnect with a fixed interval and ensure single connection attempt."""
         if self.connection_in_progress:
-            print("[DEBUG] Connection already in progress. Skipping reconnect.")
+            logger.debug("Connection already in progress. Skipping reconnect.")
             return
 
         if self.active_protocol is not None:
-            print("[DEBUG] Client is already connected. No need to reconnect.")
+            logger.debug("Client is already connected. No need to reconnect.")
             return
 
         self.connection_in_progress = True  # Mark connection as in progress
-        print(f"[INFO] Attempting to reconnect to {self.server_ip}:{self.port}...")
+        logger.info(f"Attempting to reconnect to {self.server_ip}:{self.port}...")
 
         # Create SSL context for secure connection
         class ClientContextFactory(ssl.ClientContextFactory):
@@ -415,9 +604,9 @@ class ReconnectingTCPClientFactory(protocol.ReconnectingClientFactory):
                 ca_cert_path = Path(settings.CA_CERT_PATH).resolve()
 
                 # Log paths for debugging
-                print(f"Using client key: {client_key_path}")
-                print(f"Using client cert: {client_cert_path}")
-                print(f"Using CA cert: {ca_cert_path}")
+                logger.info(f"Using client key: {client_key_path}")
+                logger.info(f"Using client cert: {client_cert_path}")
+                logger.info(f"Using CA cert: {ca_cert_path}")
 
                 # Use the certificates in the SSL context
                 context.use_certificate_file(str(client_cert_path))
@@ -448,19 +637,20 @@ class ReconnectingTCPClientFactory(protocol.ReconnectingClientFactory):
                 return context
 
         try:
+            self.connection_attempts += 1
             reactor.connectSSL(self.server_ip, self.port, self, ClientContextFactory())
         except Exception as e:
-            print(f"[ERROR] Reconnection failed: {e}")
+            logger.error(f"Reconnection failed: {e}")
         finally:
             # Schedule the next reconnect attempt after 60 seconds
             reactor.callLater(60, self._reset_connection_state_and_retry)
 
     def _reset_connection_state_and_retry(self):
         if self.active_protocol is not None:
-            print("[INFO] Client is already connected. Skipping retry.")
+            logger.info("Client is already connected. Skipping retry.")
             return
         self.connection_in_progress = False  # Allow new connection attempt
-        print("[INFO] Retrying connection...")
+        logger.info("Retrying connection...")
         self._attempt_reconnect()
 
 
@@ -477,10 +667,10 @@ class ReconnectingTCPClientFactory(protocol.ReconnectingClientFactory):
 
 def send_command_to_server(factory, command_data):
     if factory.authenticated and factory.active_protocol:
-        print(f"[INFO] Sending command to server: {command_data}")
+        logger.info(f"Sending command to server: {preview(command_data)}")
         factory.active_protocol.send_command(command_data)
     else:
-        print("[ERROR] Cannot send command: Client is not authenticated or connected.")
+        logger.error("Cannot send command: Client is not authenticated or connected.")
 
 # def graceful_shutdown(signal, frame):
 #     print("Shutting down gracefully...")
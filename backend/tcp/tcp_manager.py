@@ -1,3 +1,4 @@
+import logging
 import threading
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -7,6 +8,8 @@ from twisted.internet.error import ReactorNotRunning
 from models.lpr import DBLpr
 from shared_resources import connections
 
+logger = logging.getLogger(__name__)
+
 
 async def add_connection(session: AsyncSession, lpr_id: int|None):
     """
@@ -19,16 +22,16 @@ async def add_connection(session: AsyncSession, lpr_id: int|None):
         db_lpr = lpr_query.unique().scalar_one_or_none()
         if db_lpr and db_lpr.is_active:
             if lpr_id in connections:
-                print(f"[INFO] Connection for LPR ID {lpr_id} already exists")
+                logger.info(f"Connection for LPR ID {lpr_id} already exists")
                 return
 
             factory = ReconnectingTCPClientFactory(db_lpr.id,  db_lpr.ip, db_lpr.port, db_lpr.auth_token)
             reactor.callFromThread(factory._attempt_reconnect)
             connections[db_lpr.id] = factory
-            print(f"[INFO] Added connection for LPR ID {db_lpr.id}")
+            logger.info(f"Added connection for LPR ID {db_lpr.id}")
         else:
-            print("No lpr object found")
-    print(f"all connections: {connections}")
+            logger.info("No lpr object found")
+    logger.info(f"all connections: {connections}")
 
 
 
@@ -48,11 +51,11 @@ async def update_connection(session: AsyncSession, lpr_id: int):
             factory = ReconnectingTCPClientFactory(db_lpr.id,  db_lpr.ip, db_lpr.port, db_lpr.auth_token)
             reactor.callFromThread(factory._attempt_reconnect)
             connections[db_lpr.id] = factory
-            print(f"[INFO] Added connection for LPR ID {db_lpr.id}")
+            logger.info(f"Added connection for LPR ID {db_lpr.id}")
 
-        print(f"[INFO] Updated connection for LPR ID {db_lpr.id}")
+        logger.info(f"Updated connection for LPR ID {db_lpr.id}")
     else:
-        print("No lpr object found")
+        logger.info("No lpr object found")
 
 async def remove_connection(lpr_id: int):
     """
@@ -61,19 +64,19 @@ async def remove_connection(lpr_id: int):
     global connections
     if lpr_id in connections:
         factory = connections.pop(lpr_id)
-        print(f"[DEBUG] Active reactor: {reactor}")
-        print(f"[DEBUG] Reactor is running in thread: {threading.current_thread().name}")
+        logger.debug(f"Active reactor: {reactor}")
+        logger.debug(f"Reactor is running in thread: {threading.current_thread().name}")
 
         # Stop reconnection attempts
         reactor.callFromThread(factory.stopTrying)
         # Terminate the active connection (if any)
         if factory.active_protocol and factory.active_protocol.transport:
-            print(f"[DEBUG] Terminating connection for lpr ID {lpr_id}")
+            logger.debug(f"Terminating connection for lpr ID {lpr_id}")
             reactor.callFromThread(factory.active_protocol.transport.abortConnection)
-            print(f"[DEBUG] Connection state after loseConnection: {factory.active_protocol.transport.connected}")
+            logger.debug(f"Connection state after loseConnection: {factory.active_protocol.transport.connected}")
             factory.active_protocol = None
-        print(f"[INFO] Removed connection for LPR ID {lpr_id}")
-        print(f"all connections: {connections}")
+        logger.info(f"Removed connection for LPR ID {lpr_id}")
+        logger.info(f"all connections: {connections}")
     else:
         return f"No connection found for LPR ID {lpr_id}"
 
@@ -86,6 +89,6 @@ async def shutdown_all_connections():
         for lpr_id in list(connections.keys()):
             await remove_connection(lpr_id)
         reactor.stop()
-        print("[INFO] All connections stopped.")
+        logger.info("All connections stopped.")
     except ReactorNotRunning:
-        print("[INFO] Reactor is already stopped.")
+        logger.info("Reactor is already stopped.")
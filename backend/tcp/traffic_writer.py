@@ -0,0 +1,380 @@
+import time
+import base64
+import asyncio
+import hashlib
+import logging
+from collections import deque
+from typing import NamedTuple, Optional
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError, DataError
+
+from settings import settings
+from database.engine import async_session
+from models.traffic import DBTraffic
+from schema.traffic import TrafficCreate
+from tcp.spool import Spool
+from utils.metrics import TRAFFIC_FLUSH_LATENCY, TRAFFIC_FLUSH_ROWS, TRAFFIC_SPOOLED, TRAFFIC_REPLAYED
+from utils.topology import topology
+from utils.image_store import image_store
+from utils.plates import normalize_plate
+
+logger = logging.getLogger(__name__)
+
+
+METHOD_INSERT = "insert"  # multi-row INSERT ... RETURNING, futures resolve to the new ids
+METHOD_COPY = "copy"  # COPY via asyncpg, faster but futures resolve to None
+
+COPY_COLUMNS = (
+    "event_id", "plate_number", "plate_normalized", "ocr_accuracy", "vision_speed", "timestamp", "last_seen",
+    "hit_count", "camera_id", "gate_id", "plate_image_path",
+)
+
+# Errors caused by the rows themselves; retrying them later won't help
+ROW_ERRORS = (IntegrityError, DataError)
+# Errors that mean the database is down or too slow right now
+UNAVAILABLE_ERRORS = (SQLAlchemyError, OSError, asyncio.TimeoutError)
+# Plates of a camera missing from the topology reload it at most this often
+UNKNOWN_CAMERA_RELOAD_SECONDS = 10.0
+
+
+def event_id(camera_id: int, timestamp: str, index: int, plate_number: str) -> str:
+    """Identifies one detected plate, so that storing it again is a no-op."""
+    return hashlib.sha1(f"{camera_id}|{timestamp}|{index}|{plate_number}".encode()).hexdigest()
+
+
+class PendingTraffic(NamedTuple):
+    traffic: TrafficCreate
+    plate_image: Optional[bytes]
+    future: asyncio.Future
+
+
+class TrafficWriter:
+    """
+    Buffers detected plates from every LPR connection and stores them in
+    batches, one transaction per batch, instead of one per plate.
+
+    A batch is flushed every `flush_interval_ms` milliseconds, or as soon as
+    `max_rows` plates are waiting.
+
+    With a `spool`, a batch the database can't take within `write_timeout`
+    seconds (or at all) is appended to the spool instead, and so is every
+    plate submitted while `max_pending` plates are already buffered; a
+    background task replays the spool every `replay_interval` seconds.
+    Without one, `submit` waits for room in the buffer and failed batches
+    are lost.
+    """
+
+    def __init__(
+        self,
+        flush_interval_ms: int = 50,
+        max_rows: int = 500,
+        max_pending: int = 10000,
+        method: str = METHOD_INSERT,
+        spool: Spool = None,
+        write_timeout: float = None,
+        replay_interval: float = 5.0,
+    ):
+        if method not in (METHOD_INSERT, METHOD_COPY):
+            raise ValueError(f"Unknown traffic writer method: {method}")
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_rows = max_rows
+        self.max_pending = max_pending
+        self.method = method
+        self.spool = spool
+        self.write_timeout = write_timeout
+        self.replay_interval = replay_interval
+        self._pending = deque()
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._task = None
+        self._replay_task = None
+        self._topology_reloaded_at = float("-inf")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        if self.spool and (self._replay_task is None or self._replay_task.done()):
+            self._replay_task = asyncio.ensure_future(self._replay_loop())
+
+    async def stop(self):
+        """Stops the background tasks and stores (or spools) whatever is still buffered."""
+        for task in (self._task, self._replay_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._replay_task = None
+        await self.flush()
+        if self.spool:
+            self.spool.close()
+
+    async def submit(self, traffic: TrafficCreate, plate_image: bytes = None) -> asyncio.Future:
+        """
+        Queues a plate for the next batch. Returns a future resolved with the
+        id of the stored row, or None when it was spooled, already stored, or
+        written with COPY; or with the error that kept it from being stored.
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        entry = PendingTraffic(traffic, plate_image, future)
+
+        if self.spool and len(self._pending) >= self.max_pending:
+            # The database is falling behind; don't let that slow down ingest
+            await self._write_batch([entry], spool_only=True)
+            return future
+
+        while len(self._pending) >= self.max_pending:
+            self._space.clear()
+            await self._space.wait()
+        self._pending.append(entry)
+        if len(self._pending) >= self.max_rows:
+            self._wakeup.set()
+        return future
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        while self._pending:
+            batch = [self._pending.popleft() for _ in range(min(self.max_rows, len(self._pending)))]
+            self._space.set()
+            try:
+                await self._write_batch(batch)
+            except Exception as e:
+                logger.error(f"Failed to store a batch of {len(batch)} plates: {e}")
+                for entry in batch:
+                    if not entry.future.done():
+                        entry.future.set_exception(e)
+
+    async def _write_batch(self, batch, spool_only: bool = False):
+        start = time.perf_counter()
+        entries, rows = await self._prepare_rows(batch)
+        if not rows:
+            return
+
+        if spool_only:
+            results = await self._spool_rows(rows)
+        else:
+            try:
+                # Inside the try, so a database outage while resolving cameras spools the rows as well
+                entries, rows = await self._resolve_gates(entries, rows)
+                if not rows:
+                    return
+                results = await self._insert(rows)
+            except ROW_ERRORS as e:
+                # Store the plates one by one so a single bad row doesn't lose the whole batch
+                logger.warning(f"Batch of {len(rows)} plates failed, retrying row by row: {e}")
+                results = []
+                for index, row in enumerate(rows):
+                    try:
+                        results.extend(await self._insert([row]))
+                    except ROW_ERRORS as row_error:
+                        logger.error(f"Database error while storing traffic data: {row_error}")
+                        results.append(row_error)
+                    except UNAVAILABLE_ERRORS as error:
+                        results.extend(await self._spool_rows(rows[index:], error))
+                        break
+            except UNAVAILABLE_ERRORS as e:
+                results = await self._spool_rows(rows, e)
+
+        for entry, result in zip(entries, results):
+            if isinstance(result, Exception):
+                entry.future.set_exception(result)
+            elif not entry.future.done():
+                entry.future.set_result(result)
+        if spool_only:
+            return
+        TRAFFIC_FLUSH_ROWS.observe(len(rows))
+        TRAFFIC_FLUSH_LATENCY.observe(time.perf_counter() - start)
+        logger.debug(f"Stored {len(rows)} plates in {time.perf_counter() - start:.3f}s")
+
+    async def _insert(self, rows):
+        """Stores the rows in one transaction, giving up after `write_timeout` seconds."""
+        async def insert():
+            async with async_session() as session:
+                ids = await self._store(session, rows)
+                await session.commit()
+                return ids
+
+        return await asyncio.wait_for(insert(), self.write_timeout)
+
+    async def _spool_rows(self, rows, error: Exception = None):
+        """Appends rows to the spool. Returns the result of each row for its future."""
+        if error is not None:
+            logger.warning(f"Database unavailable, spooling {len(rows)} plates: {error!r}")
+        if self.spool is None:
+            logger.error(f"No spool configured, {len(rows)} plates are lost")
+            return [error] * len(rows)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.spool.append, rows)
+        except OSError as spool_error:
+            logger.error(f"Failed to spool {len(rows)} plates: {spool_error}")
+            return [spool_error] * len(rows)
+        TRAFFIC_SPOOLED.inc(len(rows))
+        return [None] * len(rows)
+
+    async def _replay_loop(self):
+        while True:
+            await asyncio.sleep(self.replay_interval)
+            try:
+                await self.replay()
+            except UNAVAILABLE_ERRORS as e:
+                logger.info(f"Database still unavailable, spool replay postponed: {e!r}")
+            except Exception as e:
+                logger.error(f"Spool replay failed: {e}")
+
+    async def replay(self):
+        """
+        Stores the spooled rows, oldest segment first, deleting each segment
+        once all of its rows are in. Raises when the database is still
+        unavailable; rows stored before that are skipped on the next attempt
+        through their event_id.
+        """
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(None, self.spool.has_rows):
+            return
+        for path in await loop.run_in_executor(None, self.spool.closed_segments):
+            rows = await loop.run_in_executor(None, self.spool.read_segment, path)
+            for row in rows:
+                # Spooled before plate_normalized existed
+                if row["plate_normalized"] is None:
+                    row["plate_normalized"] = normalize_plate(row["plate_number"])
+            # Rows spooled before their camera could be resolved
+            _, rows = await self._resolve_gates([None] * len(rows), rows)
+            for offset in range(0, len(rows), self.max_rows):
+                chunk = rows[offset:offset + self.max_rows]
+                try:
+                    await self._insert(chunk)
+                except ROW_ERRORS:
+                    for row in chunk:
+                        try:
+                            await self._insert([row])
+                        except ROW_ERRORS as row_error:
+                            logger.error(f"Dropping spooled plate {row['plate_number']}: {row_error}")
+            await loop.run_in_executor(None, self.spool.remove, path)
+            TRAFFIC_REPLAYED.inc(len(rows))
+            logger.info(f"Replayed {len(rows)} spooled plates from {path.name}")
+
+    async def _prepare_rows(self, batch):
+        """
+        Looks up the gate of every camera in the batch in the topology
+        registry and saves the plate images, all of them concurrently. Plates
+        whose image can't be saved fail their future here and are left out
+        of the returned rows. Rows of cameras missing from the registry keep
+        gate_id None; see _resolve_gates.
+        """
+        image_keys = await asyncio.gather(*(self._save_image(entry) for entry in batch), return_exceptions=True)
+
+        entries, rows = [], []
+        for entry, plate_image_path in zip(batch, image_keys):
+            traffic = entry.traffic
+            gate_id = topology.gate_id(traffic.camera_id)
+            if isinstance(plate_image_path, Exception):
+                entry.future.set_exception(plate_image_path)
+                logger.error(f"Failed to save plate image for {traffic.plate_number}: {plate_image_path}")
+                continue
+            entries.append(entry)
+            rows.append({
+                "event_id": traffic.event_id,
+                "plate_number": traffic.plate_number,
+                "plate_normalized": normalize_plate(traffic.plate_number),
+                "ocr_accuracy": traffic.ocr_accuracy,
+                "vision_speed": traffic.vision_speed,
+                "timestamp": traffic.timestamp.replace(tzinfo=None),
+                "last_seen": traffic.last_seen.replace(tzinfo=None) if traffic.last_seen else None,
+                "hit_count": traffic.hit_count,
+                "camera_id": traffic.camera_id,
+                "gate_id": gate_id,
+                "plate_image_path": plate_image_path,
+            })
+        return entries, rows
+
+    async def _resolve_gates(self, entries, rows):
+        """
+        Fills in the gate of rows whose camera wasn't in the topology
+        registry. The registry is reloaded for them at most every
+        UNKNOWN_CAMERA_RELOAD_SECONDS, and may raise while the database is
+        down; the caller spools the rows then. Rows whose camera is still
+        unknown fail their future (`entries` may hold None for spooled rows)
+        and are left out.
+        """
+        if all(row["gate_id"] is not None for row in rows):
+            return entries, rows
+        if time.monotonic() - self._topology_reloaded_at >= UNKNOWN_CAMERA_RELOAD_SECONDS:
+            # A camera added outside this process; reload rather than dropping its plates
+            self._topology_reloaded_at = time.monotonic()
+            await topology.load()
+
+        resolved_entries, resolved_rows = [], []
+        for entry, row in zip(entries, rows):
+            if row["gate_id"] is None:
+                row["gate_id"] = topology.gate_id(row["camera_id"])
+            if row["gate_id"] is None:
+                logger.error(f"Dropping plate {row['plate_number']}: camera {row['camera_id']} not found")
+                if entry is not None:
+                    entry.future.set_exception(ValueError(f"Camera {row['camera_id']} not found"))
+                continue
+            resolved_entries.append(entry)
+            resolved_rows.append(row)
+        return resolved_entries, resolved_rows
+
+    @staticmethod
+    async def _save_image(entry):
+        """Stores the plate image of a pending plate and returns its key, or None without an image."""
+        if entry.plate_image or entry.traffic.plate_image_path:
+            return await image_store.put(entry.plate_image or base64.b64decode(entry.traffic.plate_image_path))
+        return None
+
+    async def _store(self, session, rows):
+        """
+        Inserts the rows and returns their ids, in order. Rows whose event_id
+        is already stored are skipped and get None, as does every row with COPY.
+        """
+        if self.method == METHOD_COPY:
+            columns = ", ".join(COPY_COLUMNS)
+            # COPY can't skip conflicts, so copy into a scratch table and insert from there
+            await session.execute(text(
+                f"CREATE TEMP TABLE IF NOT EXISTS traffic_copy ON COMMIT DELETE ROWS "
+                f"AS SELECT {columns} FROM {DBTraffic.__tablename__} WITH NO DATA"
+            ))
+            connection = await session.connection()
+            raw_connection = await connection.get_raw_connection()
+            await raw_connection.driver_connection.copy_records_to_table(
+                "traffic_copy",
+                records=[tuple(row[column] for column in COPY_COLUMNS) for row in rows],
+                columns=COPY_COLUMNS,
+            )
+            await session.execute(text(
+                f"INSERT INTO {DBTraffic.__tablename__} ({columns}) SELECT {columns} FROM traffic_copy "
+                f"ON CONFLICT (event_id, timestamp) DO NOTHING"
+            ))
+            return [None] * len(rows)
+
+        result = await session.execute(
+            insert(DBTraffic)
+            .on_conflict_do_nothing(index_elements=[DBTraffic.event_id, DBTraffic.timestamp])
+            .returning(DBTraffic.id, DBTraffic.event_id),
+            rows,
+        )
+        ids = {event_id: traffic_id for traffic_id, event_id in result.all()}
+        return [ids.get(row["event_id"]) for row in rows]
+
+
+traffic_writer = TrafficWriter(
+    flush_interval_ms=settings.TRAFFIC_FLUSH_INTERVAL_MS,
+    max_rows=settings.TRAFFIC_FLUSH_MAX_ROWS,
+    max_pending=settings.TRAFFIC_WRITER_MAX_PENDING,
+    method=settings.TRAFFIC_WRITER_METHOD,
+    spool=Spool(settings.TRAFFIC_SPOOL_DIR, settings.TRAFFIC_SPOOL_SEGMENT_BYTES) if settings.TRAFFIC_SPOOL_DIR else None,
+    write_timeout=settings.TRAFFIC_WRITE_TIMEOUT_SECONDS,
+    replay_interval=settings.TRAFFIC_SPOOL_REPLAY_SECONDS,
+)
@@ -0,0 +1,138 @@
+import json
+import time
+import logging
+from collections import OrderedDict
+from sqlalchemy import event, func, select, text
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+COUNT_EXACT = "exact"  # COUNT(*) every time
+COUNT_ESTIMATE = "estimate"  # the planner's row estimate for the query
+COUNT_AUTO = "auto"  # exact below COUNT_EXACT_MAX_ROWS rows in the table, estimate above
+
+
+class CountCache:
+    """
+    Short-lived cache of list totals, keyed by table and by the SQL and
+    parameters of the filtered query. ORM writes to a table drop its entries
+    (see _invalidate_on_flush); bulk inserts that bypass the ORM, like the
+    traffic writer's, and writes from other workers are only bounded by the
+    TTL.
+
+    Holds at most `max_entries`, least recently used first out, and drops
+    expired entries whenever one is added, so distinct filter combinations
+    don't accumulate.
+    """
+
+    def __init__(self, ttl: float = 10.0, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        now = time.monotonic()
+        self._sweep(now)
+        self._entries[key] = (now + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _sweep(self, now: float):
+        for key in [key for key, (expires, _) in self._entries.items() if expires < now]:
+            del self._entries[key]
+
+    def invalidate(self, table: str):
+        for key in [key for key in self._entries if key[0] == table]:
+            del self._entries[key]
+
+
+count_cache = CountCache(ttl=settings.COUNT_CACHE_SECONDS, max_entries=settings.COUNT_CACHE_MAX_ENTRIES)
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_on_flush(session, flush_context):
+    tables = {
+        obj.__table__.name
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if hasattr(obj, "__table__")
+    }
+    for table in tables:
+        count_cache.invalidate(table)
+
+
+async def _table_rows(session: AsyncSession, table: str) -> int:
+    """The planner's row count for a table, summed over its partitions."""
+    key = (table, "reltuples")
+    rows = count_cache.get(key)
+    if rows is None:
+        rows = await session.scalar(text(
+            "SELECT COALESCE(sum(greatest(reltuples, 0)), 0) FROM pg_class "
+            "WHERE oid = to_regclass(:table) "
+            "OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(:table))"
+        ), {"table": table})
+        rows = int(rows)
+        count_cache.set(key, rows)
+    return rows
+
+
+async def _estimate_rows(session: AsyncSession, compiled) -> int:
+    """The planner's estimate of how many rows a compiled select returns, from EXPLAIN without running it."""
+    params = compiled.construct_params()
+    positional = tuple(params[name] for name in compiled.positiontup or ())
+    # In a savepoint, so a failure leaves the session's transaction usable for the fallback count
+    async with session.begin_nested():
+        connection = await session.connection()
+        result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled.string}", positional)
+        plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def count_rows(session: AsyncSession, query, strategy: str = None):
+    """
+    Returns (total, is_exact) for the rows of a select, under `strategy`
+    (COUNT_STRATEGY by default). Totals are served from count_cache when
+    possible.
+    """
+    strategy = strategy or settings.COUNT_STRATEGY
+    query = query.order_by(None)
+    table = query.get_final_froms()[0].name
+    compiled = query.compile(dialect=session.bind.dialect)
+    key = (table, strategy, compiled.string, repr(sorted(compiled.params.items(), key=lambda item: item[0])))
+    cached = count_cache.get(key)
+    if cached is not None:
+        return cached
+
+    exact = strategy == COUNT_EXACT or (
+        strategy == COUNT_AUTO and await _table_rows(session, table) <= settings.COUNT_EXACT_MAX_ROWS
+    )
+    if exact:
+        total = await session.scalar(select(func.count()).select_from(query.subquery()))
+    else:
+        try:
+            total = await _estimate_rows(session, compiled)
+        except Exception as e:
+            logger.warning(f"Failed to estimate the rows of {table}, counting them: {e}")
+            total, exact = await session.scalar(select(func.count()).select_from(query.subquery())), True
+
+    count_cache.set(key, (total, exact))
+    return total, exact
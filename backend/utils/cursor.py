@@ -0,0 +1,26 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException, status
+
+
+DIRECTION_NEXT = "next"
+DIRECTION_PREV = "prev"
+
+
+def encode_cursor(timestamp: datetime, id: int, direction: str = DIRECTION_NEXT) -> str:
+    """Opaque cursor pointing just after (next) or before (prev) the row (timestamp, id)."""
+    payload = json.dumps([timestamp.isoformat(), id, direction], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Returns (timestamp, id, direction) from a cursor made by encode_cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, id, direction = json.loads(base64.urlsafe_b64decode(padded))
+        if direction not in (DIRECTION_NEXT, DIRECTION_PREV):
+            raise ValueError(direction)
+        return datetime.fromisoformat(timestamp), int(id), direction
+    except (ValueError, TypeError):
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid cursor.")
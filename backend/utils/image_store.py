@@ -0,0 +1,116 @@
+import os
+import uuid
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ImageStore:
+    """
+    Content-addressed store for plate images.
+
+    An image is named by the sha256 of its bytes and kept two directory
+    levels deep (`ab/cd/abcd....jpg`), so no directory grows past a few
+    hundred entries even with millions of images, and identical images are
+    stored once. Writes run in a thread pool and go through a temporary file
+    and a rename, so a reader never sees a partial image.
+
+    Files are fsynced in batches every `fsync_interval_ms` rather than one by
+    one; an image written less than that long before a power loss may be lost.
+    """
+
+    def __init__(self, root: str, workers: int = 4, fsync_interval_ms: int = 1000, extension: str = ".jpg"):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.extension = extension
+        self.fsync_interval = fsync_interval_ms / 1000
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-store")
+        self._known_dirs = set()
+        self._unsynced = []
+        self._sync_task = None
+
+    def key_for(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        return f"{digest[:2]}/{digest[2:4]}/{digest}{self.extension}"
+
+    def relative_key(self, value: str) -> str:
+        """
+        Returns the path of a stored image relative to the store root, for
+        both keys and the full paths stored before images were sharded.
+        """
+        parts = Path(value).parts
+        if len(parts) >= 3 and parts[-1].startswith(parts[-3] + parts[-2]):
+            return "/".join(parts[-3:])
+        # Written before sharding: uploads/plate_images/<plate>_<timestamp>.jpg
+        return parts[-1]
+
+    def path(self, value: str) -> Path:
+        """Returns the file path of a stored image from its key (or legacy path)."""
+        return self.root / self.relative_key(value)
+
+    async def put(self, data: bytes) -> str:
+        """Stores an image and returns its key, the value kept in plate_image_path."""
+        loop = asyncio.get_running_loop()
+        key, written = await loop.run_in_executor(self._executor, self._write, data)
+        if written:
+            self._unsynced.append(self.root / key)
+            if self._sync_task is None or self._sync_task.done():
+                self._sync_task = asyncio.ensure_future(self._sync_later())
+        return key
+
+    def _write(self, data: bytes):
+        key = self.key_for(data)
+        path = self.root / key
+        if path.exists():
+            return key, False
+
+        directory = path.parent
+        if directory not in self._known_dirs:
+            directory.mkdir(parents=True, exist_ok=True)
+            self._known_dirs.add(directory)
+        temp_path = directory / f".{path.name}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "wb") as image_file:
+            image_file.write(data)
+        os.replace(temp_path, path)
+        return key, True
+
+    async def _sync_later(self):
+        await asyncio.sleep(self.fsync_interval)
+        await self.sync()
+
+    async def sync(self):
+        """Fsyncs every image written since the last sync, and their directories."""
+        paths, self._unsynced = self._unsynced, []
+        if paths:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._fsync, paths)
+
+    @staticmethod
+    def _fsync(paths):
+        for path in [*paths, *{path.parent for path in paths}]:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                logger.warning(f"Failed to fsync {path}: {e}")
+
+    async def close(self):
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+        await self.sync()
+        self._executor.shutdown(wait=True)
+
+
+image_store = ImageStore(
+    settings.PLATE_IMAGE_DIR,
+    workers=settings.IMAGE_STORE_WORKERS,
+    fsync_interval_ms=settings.IMAGE_STORE_FSYNC_INTERVAL_MS,
+)
@@ -0,0 +1,133 @@
+import time
+from prometheus_client import Counter, Histogram, REGISTRY
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+
+from shared_resources import connections, live_slots
+
+
+# Latency buckets from 0.5 ms to 10 s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+BYTES_RECEIVED = Counter(
+    "lpr_bytes_received_total", "Bytes received from the LPR module", ["lpr_id"]
+)
+FRAMES_RECEIVED = Counter(
+    "lpr_frames_received_total", "Frames received from the LPR module", ["lpr_id", "message_type"]
+)
+PARSE_LATENCY = Histogram(
+    "lpr_parse_seconds", "Time spent decoding a frame", ["lpr_id"], buckets=LATENCY_BUCKETS
+)
+HANDLER_LATENCY = Histogram(
+    "lpr_handler_seconds", "Time spent in a message handler", ["lpr_id", "message_type"], buckets=LATENCY_BUCKETS
+)
+DB_WRITE_LATENCY = Histogram(
+    "lpr_db_write_seconds", "Time from receiving a plates_data frame until its plates are stored", ["lpr_id"], buckets=LATENCY_BUCKETS
+)
+TRAFFIC_FLUSH_LATENCY = Histogram(
+    "traffic_writer_flush_seconds", "Time spent storing one batch of plates", buckets=LATENCY_BUCKETS
+)
+TRAFFIC_FLUSH_ROWS = Histogram(
+    "traffic_writer_flush_rows", "Plates stored per batch", buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+TRAFFIC_SPOOLED = Counter(
+    "traffic_spooled_total", "Plates written to the local spool because the database was unavailable"
+)
+TRAFFIC_REPLAYED = Counter(
+    "traffic_replayed_total", "Spooled plates replayed into the database"
+)
+PLATE_BURSTS = Counter(
+    "plate_bursts_total", "Plate events stored after merging consecutive reads of the same plate"
+)
+PLATE_READS_MERGED = Counter(
+    "plate_reads_merged_total", "Plate reads merged into an already open burst instead of stored"
+)
+EMIT_LATENCY = Histogram(
+    "socketio_emit_seconds", "Time spent emitting an event to its Socket.IO subscribers", ["event"], buckets=LATENCY_BUCKETS
+)
+LIVE_FRAMES = Counter(
+    "socketio_live_frames_total", "Live frames handed to subscribers, or replaced by a newer one while they were busy", ["camera_id", "outcome"]
+)
+
+
+class LprMetrics:
+    """Metric children bound to one LPR, so the hot paths skip label lookups."""
+
+    def __init__(self, lpr_id):
+        self.lpr_id = str(lpr_id)
+        self.bytes_received = BYTES_RECEIVED.labels(self.lpr_id)
+        self.parse_latency = PARSE_LATENCY.labels(self.lpr_id)
+        self.db_write_latency = DB_WRITE_LATENCY.labels(self.lpr_id)
+        self._frames = {}
+        self._handlers = {}
+
+    def frame_received(self, message_type):
+        counter = self._frames.get(message_type)
+        if counter is None:
+            counter = self._frames[message_type] = FRAMES_RECEIVED.labels(self.lpr_id, str(message_type))
+        counter.inc()
+
+    def handler_latency(self, message_type):
+        histogram = self._handlers.get(message_type)
+        if histogram is None:
+            histogram = self._handlers[message_type] = HANDLER_LATENCY.labels(self.lpr_id, str(message_type))
+        return histogram
+
+
+class LprConnectionCollector:
+    """
+    Reports the state of every LPR connection at scrape time: connection and
+    authentication state, reconnect attempts, uptime, and the depth and drop
+    counters of its ingest queue.
+    """
+
+    def collect(self):
+        connected = GaugeMetricFamily("lpr_connected", "Whether the LPR connection is up", labels=["lpr_id"])
+        authenticated = GaugeMetricFamily("lpr_authenticated", "Whether the LPR connection is authenticated", labels=["lpr_id"])
+        reconnects = CounterMetricFamily("lpr_reconnects", "Connection attempts made to the LPR", labels=["lpr_id"])
+        uptime = GaugeMetricFamily("lpr_connection_uptime_seconds", "Seconds since the current connection was made", labels=["lpr_id"])
+        queue_depth = GaugeMetricFamily("lpr_queue_depth", "Messages waiting in the ingest queue", labels=["lpr_id", "message_class"])
+        dropped = CounterMetricFamily("lpr_queue_dropped", "Messages dropped or coalesced by the ingest queue", labels=["lpr_id", "message_type"])
+
+        now = time.monotonic()
+        for lpr_id, factory in list(connections.items()):
+            lpr_id = str(lpr_id)
+            client = factory.active_protocol
+            connected.add_metric([lpr_id], 1 if client else 0)
+            authenticated.add_metric([lpr_id], 1 if factory.authenticated and client else 0)
+            reconnects.add_metric([lpr_id], factory.connection_attempts)
+            uptime.add_metric([lpr_id], now - factory.connected_at if client and factory.connected_at else 0)
+            if client:
+                for message_class, depth in client.message_queue.depth().items():
+                    queue_depth.add_metric([lpr_id, message_class], depth)
+                for message_type, count in client.message_queue.dropped.items():
+                    dropped.add_metric([lpr_id, str(message_type)], count)
+
+        yield from (connected, authenticated, reconnects, uptime, queue_depth, dropped)
+
+
+class LiveSubscriberCollector:
+    """
+    Reports the live subscriptions of each camera at scrape time: how many
+    there are, how many have a frame waiting for the client's socket, and
+    the delivered frame rate of the slowest one. Aggregated per camera, as
+    Socket.IO sids change on every reconnect.
+    """
+
+    def collect(self):
+        subscribers = GaugeMetricFamily("socketio_live_subscribers", "Live subscriptions of the camera", labels=["camera_id"])
+        in_flight = GaugeMetricFamily("socketio_live_in_flight", "Live subscriptions with a frame waiting for the client's socket", labels=["camera_id"])
+        slowest = GaugeMetricFamily("socketio_live_min_delivered_fps", "Lowest recent delivered frame rate among the camera's subscribers", labels=["camera_id"])
+
+        cameras = {}
+        for slot in list(live_slots.values()):
+            cameras.setdefault(str(slot.camera_id), []).append(slot)
+        for camera_id, slots in cameras.items():
+            subscribers.add_metric([camera_id], len(slots))
+            in_flight.add_metric([camera_id], sum(1 for slot in slots if slot.in_flight))
+            slowest.add_metric([camera_id], min(slot.fps() for slot in slots))
+
+        yield from (subscribers, in_flight, slowest)
+
+
+REGISTRY.register(LprConnectionCollector())
+REGISTRY.register(LiveSubscriberCollector())
@@ -0,0 +1,52 @@
+import math
+
+from settings import settings
+
+
+def _build_tables(groups: str, ignored: str):
+    """
+    Turns "0۰٠,بپتث" into the (from, to) strings mapping every character of a
+    group to its first one, with the ignored characters appended to `from`
+    only, which is how both str.maketrans and PostgreSQL's translate() drop
+    characters.
+    """
+    source, target = "", ""
+    for group in filter(None, (part.strip() for part in groups.split(","))):
+        canonical, *confusable = group
+        for char in confusable:
+            source += char
+            target += canonical
+    return source + ignored, target
+
+
+CONFUSION_FROM, CONFUSION_TO = _build_tables(settings.PLATE_CONFUSION_GROUPS, settings.PLATE_IGNORED_CHARS)
+_table = str.maketrans(CONFUSION_FROM[:len(CONFUSION_TO)], CONFUSION_TO, CONFUSION_FROM[len(CONFUSION_TO):])
+
+
+def normalize_plate(plate: str) -> str:
+    """
+    Maps a plate to its search form: digits unified across scripts, glyphs
+    that OCR confuses with each other folded into one, separators removed.
+    Must stay identical to the translate() expression used for backfills.
+    """
+    return plate.translate(_table) if plate else plate
+
+
+def escape_like(value: str, escape: str = "\\") -> str:
+    """Escapes the LIKE wildcards in a user-supplied pattern fragment."""
+    return value.replace(escape, escape * 2).replace("%", escape + "%").replace("_", escape + "_")
+
+
+def fuzzy_similarity_threshold(normalized: str, max_distance: int) -> float:
+    """
+    The lowest trigram similarity a plate within `max_distance` edits of the
+    query can have, so the similarity (%) prefilter never drops a plate
+    levenshtein() would keep. pg_trgm pads a word into len + 1 trigrams; an
+    edit removes at most three of the query's and adds at most one to the
+    plate's, so at least distinct - 3k are shared out of len + 1 + 4k.
+    """
+    padded = "  " + normalized.lower() + " "
+    distinct = len({padded[index:index + 3] for index in range(len(normalized) + 1)})
+    shared = distinct - 3 * max_distance
+    # Rounded down, pg_trgm computes similarity in single precision
+    return max(0.0, math.floor(shared / (len(normalized) + 1 + 4 * max_distance) * 100) / 100)
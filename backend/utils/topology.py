@@ -0,0 +1,105 @@
+import time
+import asyncio
+import logging
+from typing import NamedTuple, Optional
+from sqlalchemy.future import select
+
+from settings import settings
+from database.engine import async_session
+from models.camera import DBCamera
+from models.gate import DBGate
+from models.lpr import DBLpr
+
+logger = logging.getLogger(__name__)
+
+
+class CameraInfo(NamedTuple):
+    camera_id: int
+    gate_id: int
+    lpr_id: int
+    is_active: bool
+
+
+class LprInfo(NamedTuple):
+    lpr_id: int
+    is_active: bool
+    camera_ids: frozenset
+
+
+class TopologyRegistry:
+    """
+    In-memory copy of the camera -> gate/LPR mapping and of the cameras of
+    every LPR, so the ingest and Socket.IO paths don't query the database
+    for it.
+
+    Loaded in the lifespan and reloaded by the camera, gate and LPR CRUD
+    operations after they commit. As a safety net for changes made by other
+    processes, a lookup older than TOPOLOGY_REFRESH_SECONDS schedules a
+    reload in the background.
+    """
+
+    def __init__(self, refresh_seconds: float = 300.0):
+        self.refresh_seconds = refresh_seconds
+        self.cameras = {}  # camera_id -> CameraInfo
+        self.lprs = {}  # lpr_id -> LprInfo
+        self.gates = {}  # gate_id -> is_active
+        self.loaded_at = None
+        self._lock = asyncio.Lock()
+        self._generation = 0
+        self._refresh_task = None
+
+    async def load(self):
+        """Reads the topology from the database and replaces the current one."""
+        generation = self._generation
+        async with self._lock:
+            if generation < self._generation:
+                # Another load started after this call was made already covers it
+                return
+            self._generation += 1
+            async with async_session() as session:
+                cameras = (await session.execute(
+                    select(DBCamera.id, DBCamera.gate_id, DBCamera.lpr_id, DBCamera.is_active)
+                )).all()
+                lprs = (await session.execute(select(DBLpr.id, DBLpr.is_active))).all()
+                gates = (await session.execute(select(DBGate.id, DBGate.is_active))).all()
+
+            lpr_cameras = {lpr_id: set() for lpr_id, _ in lprs}
+            for camera in cameras:
+                lpr_cameras.setdefault(camera.lpr_id, set()).add(camera.id)
+
+            # Built aside and swapped in at once, so readers never see a partial topology
+            self.cameras = {camera.id: CameraInfo(*camera) for camera in cameras}
+            self.lprs = {lpr_id: LprInfo(lpr_id, is_active, frozenset(lpr_cameras[lpr_id])) for lpr_id, is_active in lprs}
+            self.gates = dict(gates)
+            self.loaded_at = time.monotonic()
+        logger.info(f"Topology loaded: {len(self.cameras)} cameras, {len(self.lprs)} LPRs, {len(self.gates)} gates")
+
+    async def invalidate(self):
+        """Called after a camera, gate or LPR change is committed."""
+        try:
+            await self.load()
+        except Exception as e:
+            # The change is already committed; retry on the next lookup instead of failing the request
+            logger.error(f"Failed to reload topology: {e}")
+            self.loaded_at = float("-inf")
+
+    def _refresh_if_stale(self):
+        if self.loaded_at is None or time.monotonic() - self.loaded_at < self.refresh_seconds:
+            return
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self.load())
+
+    def camera(self, camera_id: int) -> Optional[CameraInfo]:
+        self._refresh_if_stale()
+        return self.cameras.get(camera_id)
+
+    def lpr(self, lpr_id: int) -> Optional[LprInfo]:
+        self._refresh_if_stale()
+        return self.lprs.get(lpr_id)
+
+    def gate_id(self, camera_id: int) -> Optional[int]:
+        camera = self.camera(camera_id)
+        return camera.gate_id if camera else None
+
+
+topology = TopologyRegistry(refresh_seconds=settings.TOPOLOGY_REFRESH_SECONDS)
@@ -0,0 +1,326 @@
+import io
+import csv
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from zipfile import ZipFile, ZIP_STORED
+
+from openpyxl import Workbook
+
+from database.engine import async_session
+from models.traffic import DBTraffic
+from utils.image_store import image_store
+
+logger = logging.getLogger(__name__)
+
+
+EXPORT_COLUMNS = (
+    DBTraffic.id, DBTraffic.plate_number, DBTraffic.ocr_accuracy, DBTraffic.vision_speed,
+    DBTraffic.timestamp, DBTraffic.camera_id, DBTraffic.gate_id, DBTraffic.plate_image_path,
+)
+EXPORT_HEADERS = ["ID", "Plate Number", "OCR Accuracy", "Vision Speed", "Timestamp", "Camera ID", "Gate ID", "Plate Image"]
+CHUNK_SIZE = 64 * 1024
+FETCH_ROWS = 1000
+
+FORMAT_ZIP = "zip"
+FORMAT_CSV = "csv"
+FORMAT_PARQUET = "parquet"
+EXPORT_FORMATS = (FORMAT_ZIP, FORMAT_CSV, FORMAT_PARQUET)
+# Columnar exports leave the images out and carry the burst columns instead
+COLUMNAR_COLUMNS = (
+    DBTraffic.id, DBTraffic.plate_number, DBTraffic.ocr_accuracy, DBTraffic.vision_speed, DBTraffic.timestamp,
+    DBTraffic.last_seen, DBTraffic.hit_count, DBTraffic.camera_id, DBTraffic.gate_id,
+)
+# Rows per server-side cursor fetch, and per Parquet row group
+COLUMNAR_FETCH_ROWS = 50000
+# Chunks and rows in flight between the event loop and the archive thread
+QUEUE_SIZE = 16
+_END = object()
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class _QueueWriter:
+    """
+    Write-only file object handed to ZipFile: collects what the archive
+    writes and passes it on to the event loop in CHUNK_SIZE pieces. Not
+    seekable, so ZipFile writes sizes after each entry (data descriptors).
+    """
+
+    def __init__(self, export):
+        self.export = export
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= CHUNK_SIZE:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self.buffer:
+            self.export.put_chunk(bytes(self.buffer))
+            self.buffer.clear()
+
+    def close(self):
+        self.flush()
+
+
+class TrafficArchive:
+    """
+    Writes a ZIP of traffic_data.xlsx and plate images to a file object,
+    one row (EXPORT_COLUMNS) at a time. Each image is copied into the
+    archive in CHUNK_SIZE reads as plate_images/<traffic id>.jpg, while the
+    row goes to a write-only worksheet, which openpyxl keeps in a temporary
+    file; the workbook is added on close. The output doesn't need to be
+    seekable.
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet("Traffic Data")
+        self.sheet.append(EXPORT_HEADERS)
+        # JPEGs and XLSX are compressed already, so entries are stored as is
+        self.zip = ZipFile(output, "w", compression=ZIP_STORED)
+
+    def add(self, row):
+        id, plate_number, ocr_accuracy, vision_speed, timestamp, camera_id, gate_id, plate_image_path = row
+        image_name = self._copy_image(id, plate_image_path) if plate_image_path else None
+        self.sheet.append([
+            id, plate_number, ocr_accuracy, vision_speed, timestamp.isoformat(), camera_id, gate_id, image_name,
+        ])
+
+    def _copy_image(self, id: int, plate_image_path: str):
+        """Copies a plate image into the archive, returning its name there."""
+        source = image_store.path(plate_image_path)
+        name = f"plate_images/{id}{source.suffix or '.jpg'}"
+        try:
+            with open(source, "rb") as image_file, self.zip.open(name, "w") as entry:
+                while chunk := image_file.read(CHUNK_SIZE):
+                    entry.write(chunk)
+        except FileNotFoundError:
+            return None
+        return name
+
+    def close(self):
+        with self.zip.open("traffic_data.xlsx", "w", force_zip64=True) as workbook_file:
+            self.workbook.save(workbook_file)
+        self.zip.close()
+        if hasattr(self.output, "flush"):
+            self.output.flush()
+
+    def discard(self):
+        """Releases an archive that won't be closed. save() removes the worksheet's temporary file; this has to."""
+        if not self.sheet.closed:
+            self.sheet.close()
+            self.sheet._writer.cleanup()
+        try:
+            self.zip.close()
+        except Exception:
+            pass
+
+
+class TrafficExport:
+    """
+    Streams a ZIP of traffic_data.xlsx and the plate images of the rows
+    selected by a query, without building it in memory or on disk first.
+
+    The rows are read on the event loop through a server-side cursor,
+    FETCH_ROWS at a time, and handed to a thread that writes them to a
+    TrafficArchive. The archive is handed back to the event loop in chunks through a
+    bounded queue, so a slow client slows the export down instead of
+    filling memory.
+    """
+
+    def __init__(self, query):
+        self.query = query.with_only_columns(*EXPORT_COLUMNS).order_by(DBTraffic.timestamp, DBTraffic.id)
+        self._rows = asyncio.Queue(QUEUE_SIZE)
+        self._chunks = asyncio.Queue(QUEUE_SIZE)
+        self._cancelled = threading.Event()
+        self._loop = None
+
+    async def stream(self):
+        self._loop = asyncio.get_running_loop()
+        writer = threading.Thread(target=self._write_archive, name="traffic-export", daemon=True)
+        writer.start()
+        reader = asyncio.ensure_future(self._read_rows())
+        try:
+            while True:
+                chunk = await self._chunks.get()
+                if chunk is _END:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            # The client went away or the export failed: unblock and stop both sides
+            self._cancelled.set()
+            reader.cancel()
+            while not self._chunks.empty():
+                self._chunks.get_nowait()
+
+    async def _read_rows(self):
+        try:
+            async with async_session() as session:
+                result = await session.stream(self.query.execution_options(yield_per=FETCH_ROWS))
+                async for row in result:
+                    await self._rows.put(tuple(row))
+        except Exception as e:
+            logger.error(f"Failed to read traffic for export: {e}")
+            await self._rows.put(e)
+            return
+        await self._rows.put(_END)
+
+    def _call(self, coroutine):
+        """Runs a queue operation on the event loop from the archive thread, giving up once cancelled."""
+        if self._cancelled.is_set():
+            coroutine.close()
+            raise ExportCancelled()
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+        while True:
+            try:
+                return future.result(timeout=1)
+            except concurrent.futures.TimeoutError:
+                if self._cancelled.is_set():
+                    future.cancel()
+                    raise ExportCancelled()
+
+    def put_chunk(self, chunk):
+        self._call(self._chunks.put(chunk))
+
+    def _write_archive(self):
+        try:
+            self._write_entries()
+            self._call(self._chunks.put(_END))
+        except ExportCancelled:
+            logger.info("Traffic export cancelled")
+        except Exception as e:
+            logger.error(f"Failed to write traffic export: {e}")
+            try:
+                self._call(self._chunks.put(e))
+            except ExportCancelled:
+                pass
+
+    def _write_entries(self):
+        archive = TrafficArchive(_QueueWriter(self))
+        try:
+            while True:
+                row = self._call(self._rows.get())
+                if row is _END:
+                    break
+                if isinstance(row, Exception):
+                    raise row
+                archive.add(row)
+            archive.close()
+        except BaseException:
+            archive.discard()
+            raise
+
+
+class _CsvEncoder:
+    media_type = "text/csv"
+
+    def __init__(self):
+        self._header = [column.name for column in COLUMNAR_COLUMNS]
+
+    def encode(self, rows) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if self._header:
+            writer.writerow(self._header)
+            self._header = None
+        writer.writerows(rows)
+        return buffer.getvalue().encode()
+
+    def close(self) -> bytes:
+        return self.encode([]) if self._header else b""
+
+
+class _DrainBuffer(io.RawIOBase):
+    """Append-only sink for the Parquet writer, emptied after every row group."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+class _ParquetEncoder:
+    media_type = "application/vnd.apache.parquet"
+
+    def __init__(self):
+        # Only needed for this format
+        import pyarrow
+        import pyarrow.parquet
+
+        self._pyarrow = pyarrow
+        self.schema = pyarrow.schema([
+            ("id", pyarrow.int64()),
+            ("plate_number", pyarrow.string()),
+            ("ocr_accuracy", pyarrow.float64()),
+            ("vision_speed", pyarrow.float64()),
+            ("timestamp", pyarrow.timestamp("us")),
+            ("last_seen", pyarrow.timestamp("us")),
+            ("hit_count", pyarrow.int32()),
+            ("camera_id", pyarrow.int32()),
+            ("gate_id", pyarrow.int32()),
+        ])
+        self._sink = _DrainBuffer()
+        self._writer = pyarrow.parquet.ParquetWriter(self._sink, self.schema, compression="zstd")
+
+    def encode(self, rows) -> bytes:
+        columns = zip(*rows)
+        arrays = [self._pyarrow.array(values, type=field.type) for values, field in zip(columns, self.schema)]
+        self._writer.write_table(self._pyarrow.Table.from_arrays(arrays, schema=self.schema))
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+class ColumnarExport:
+    """
+    Streams the rows selected by a query as CSV or Parquet, without images.
+
+    Rows are fetched COLUMNAR_FETCH_ROWS at a time through a server-side
+    cursor, and each batch is encoded in the default executor (as one
+    Parquet row group, zstd-compressed) and sent before the next one is
+    fetched, so memory use is bounded by one batch.
+    """
+
+    def __init__(self, query, format: str):
+        self.query = query.with_only_columns(*COLUMNAR_COLUMNS).order_by(DBTraffic.timestamp, DBTraffic.id)
+        self.encoder = _ParquetEncoder() if format == FORMAT_PARQUET else _CsvEncoder()
+        self.media_type = self.encoder.media_type
+
+    async def stream(self):
+        loop = asyncio.get_running_loop()
+        async with async_session() as session:
+            result = await session.stream(self.query.execution_options(yield_per=COLUMNAR_FETCH_ROWS))
+            async for rows in result.partitions():
+                chunk = await loop.run_in_executor(None, self.encoder.encode, rows)
+                if chunk:
+                    yield chunk
+        chunk = await loop.run_in_executor(None, self.encoder.close)
+        if chunk:
+            yield chunk